@@ -1,11 +1,19 @@
 # app.py
 import os
-from flask import Flask, render_template
+from flask import Flask, render_template, g
 from werkzeug.exceptions import HTTPException
 from pathlib import Path
 from md_viewer import md_viewer_bp
+from md_viewer.search_index import init_search_index
+from md_viewer.support_functions import NOTES_FOLDER, note_links, attachments
+from md_viewer.warmup import start_warmup
+from md_viewer.link_graph import link_graph
+from md_viewer.static_assets import build_highlight_bundle
+from md_viewer.compression import compress_response
+from md_viewer.file_offload import init_file_offload
 from app_settings_loader import (
-    ensure_settings_ini, get_setting, FLASK_HOST, FLASK_PORT
+    ensure_settings_ini, get_setting, FLASK_HOST, FLASK_PORT,
+    pin_settings_snapshot, unpin_settings_snapshot
 )
 import logging
 
@@ -31,6 +39,42 @@ app.config['IMAGE_SUBFOLDER_NAME'] = get_setting('MD_NOTES_APP', 'IMAGE_SUBFOLDE
 # Register the md_viewer blueprint
 app.register_blueprint(md_viewer_bp)
 
+# Bundle highlight.js into one fingerprinted file if it is served locally
+build_highlight_bundle()
+
+# List the notes [[wikilinks]] and the attachments ![[embeds]] can point to
+note_links.build()
+attachments.build()
+
+# Pre-render the vault into the rendered note cache. The worker processes are
+# forked here, before the search index thread below is started
+if get_setting('MD_NOTES_APP', 'WARMUP_ON_START', fallback=False, type_=bool):
+    start_warmup(app, workers=get_setting('MD_NOTES_APP', 'WARMUP_WORKERS', fallback=0, type_=int))
+
+# Build the full-text search index in the background, /search scans the
+# vault until it is ready
+init_search_index(NOTES_FOLDER)
+# Same for the backlinks / outgoing links graph
+link_graph.build_in_background()
+
+
+# Every request reads one consistent settings snapshot, even if a settings
+# form is saved while it is running
+@app.before_request
+def pin_settings():
+    g.settings_token = pin_settings_snapshot()
+
+# Compress HTML / JSON / text responses for clients that accept it
+app.after_request(compress_response)
+# Leave sending files to the front proxy (FILE_OFFLOAD)
+init_file_offload(app)
+
+@app.teardown_request
+def unpin_settings(exc=None):
+    token = g.pop('settings_token', None)
+    if token is not None:
+        unpin_settings_snapshot(token)
+
 
 # Custom error handler using base.html
 @app.errorhandler(Exception)
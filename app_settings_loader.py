@@ -17,8 +17,11 @@ notes_dir = get_setting('FLASK', 'NOTES_DIR', fallback='notes')
 """
 
 import configparser
+import contextvars
 from pathlib import Path
 import os
+import tempfile
+import threading
 
 
 CONFIG_FILE_NAME = 'settings.ini'
@@ -34,6 +37,17 @@ class CaseSensitiveConfigParser(configparser.ConfigParser):
         # Make options case-sensitive
         self.optionxform = str
 
+# Parsed settings.ini shared by the whole process. 'stamp' is the (mtime, size)
+# of the file the parser was built from, so edits made outside the app are
+# still picked up on the next read. A published parser is a snapshot and is
+# never modified afterwards - writers build a new one and swap it in.
+_settings_cache = {'stamp': None, 'config': None}
+_settings_lock = threading.Lock()
+# Serializes writers so two form posts can't interleave their read-modify-write
+_settings_write_lock = threading.Lock()
+# Snapshot pinned for the current request (see pin_settings_snapshot)
+_pinned_settings = contextvars.ContextVar('pinned_settings', default=None)
+
 # Use uppercase for all DEFAULT_CONFIG keys
 DEFAULT_CONFIG = {
     'FLASK': {
@@ -66,9 +80,63 @@ DEFAULT_CONFIG = {
         'ALLOWED_IMAGE_EXTENSIONS': 'jpg, jpeg, png, webp',
         'Allowed file extensions for text files what will be visible and viewable': None,
         'ALLOWED_FILE_EXTENSIONS': 'txt, pdf, html, json, yaml, yml, conf, csv, cmd, bat, sh',
+        'Side panel sends only the top level and the open folder, other folders are loaded when expanded (for large vaults)': None,
+        'SIDEBAR_LAZY_LOAD': 'False',
+        'Search index backend: memory (rebuilt on every start) or sqlite (kept on disk in SEARCH_INDEX_FILE, shared by workers)': None,
+        'SEARCH_BACKEND': 'memory',
+        'SEARCH_INDEX_FILE': 'search_index.sqlite3',
+        'Memory in MB for caching rendered notes (0 disables the cache)': None,
+        'RENDER_CACHE_MB': '64',
+        'Pre-render all notes into the rendered note cache when the app starts, using WARMUP_WORKERS processes (0 = one per CPU). With several app worker processes only the first one pre-renders': None,
+        'WARMUP_ON_START': 'False',
+        'WARMUP_WORKERS': '0',
+        'Folder for generated image thumbnails, and how many thumbnails are generated at the same time': None,
+        'THUMBNAIL_CACHE_DIR': 'thumbnail_cache',
+        'THUMBNAIL_WORKERS': '2',
+        'Load highlight.js from the public CDN (cdn) or as one bundled file from md_viewer/static/highlight (local, works offline)': None,
+        'HIGHLIGHT_SOURCE': 'cdn',
+        'Compress text responses of at least COMPRESS_MIN_SIZE bytes (gzip, or brotli if installed), and keep COMPRESSED_CACHE_MB of compressed note pages': None,
+        'COMPRESS_RESPONSES': 'True',
+        'COMPRESS_MIN_SIZE': '1024',
+        'COMPRESSED_CACHE_MB': '32',
+        'Let the front proxy send files: off, x-sendfile (Apache/lighttpd) or x-accel-redirect (nginx, internal location FILE_OFFLOAD_PREFIX, see deploy/nginx.conf). Needs a restart': None,
+        'FILE_OFFLOAD': 'off',
+        'FILE_OFFLOAD_PREFIX': '/_offload',
+        'Large uploads are sent in chunks of UPLOAD_CHUNK_SIZE_MB and can be resumed; unfinished uploads are kept in UPLOAD_TEMP_DIR for CHUNKED_UPLOAD_EXPIRE_HOURS': None,
+        'UPLOAD_CHUNK_SIZE_MB': '4',
+        'CHUNKED_UPLOAD_MAX_MB': '2048',
+        'CHUNKED_UPLOAD_EXPIRE_HOURS': '24',
+        'UPLOAD_TEMP_DIR': 'upload_temp',
+        'Number of files checked and saved at the same time by batch uploads': None,
+        'UPLOAD_WORKERS': '4',
+        'Name pasted images after their content, so pasting the same image again reuses the stored file (hard-linked between note folders)': None,
+        'PASTED_IMAGE_DEDUP': 'False',
     },
 }
 
+def _atomic_write(write_func):
+    """
+    Write settings.ini through a temp file in the same directory and rename it
+    into place, so readers only ever see the old or the new complete file.
+    write_func receives the open temp file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=ROOT_DIR, prefix='.settings.', suffix='.tmp')
+    try:
+        # Keep the permissions of the file we are replacing (mkstemp uses 0600)
+        mode = os.stat(CONFIG_FILE).st_mode & 0o777 if os.path.exists(CONFIG_FILE) else 0o644
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'w') as f:
+            write_func(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CONFIG_FILE)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
 def ensure_settings_ini():
     """
     Ensure that settings.ini exists and contains all required settings.
@@ -80,7 +148,7 @@ def ensure_settings_ini():
     # First check if file exists at all
     if not Path(CONFIG_FILE).exists():
         # Create new file with all default settings and comments
-        with open(CONFIG_FILE, 'w') as f:
+        def write_defaults(f):
             for section, values in DEFAULT_CONFIG.items():
                 f.write(f'[{section}]\n')
                 
@@ -111,6 +179,7 @@ def ensure_settings_ini():
                         # Write the setting
                         f.write(f'{key} = {value}\n')
                 f.write('\n')
+        _atomic_write(write_defaults)
         return
 
     # If file exists, read it line by line to preserve comments and case
@@ -195,13 +264,54 @@ def ensure_settings_ini():
         new_lines.append('')  # Single newline after section
     
     # Write the updated file
-    with open(CONFIG_FILE, 'w') as f:
-        f.write('\n'.join(new_lines) + '\n')
+    _atomic_write(lambda f: f.write('\n'.join(new_lines) + '\n'))
+
+def _settings_file_stamp():
+    """Return (mtime_ns, size) of settings.ini, or None if it does not exist"""
+    try:
+        st = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _load_settings():
+    """
+    Return the settings snapshot to read from: the one pinned for the current
+    request if any, otherwise the cached parser, re-reading settings.ini only
+    if it changed on disk.
+    """
+    pinned = _pinned_settings.get()
+    if pinned is not None:
+        return pinned
+    stamp = _settings_file_stamp()
+    with _settings_lock:
+        if _settings_cache['config'] is None or _settings_cache['stamp'] != stamp:
+            config = CaseSensitiveConfigParser()
+            config.read(CONFIG_FILE)
+            config.stamp = stamp
+            _settings_cache['config'] = config
+            _settings_cache['stamp'] = stamp
+        return _settings_cache['config']
+
+def pin_settings_snapshot():
+    """
+    Pin the current settings snapshot for the running context (one request),
+    so a concurrent settings save does not change values halfway through it.
+    Returns a token for unpin_settings_snapshot().
+    """
+    return _pinned_settings.set(_load_settings())
+
+def unpin_settings_snapshot(token):
+    """Release a snapshot pinned with pin_settings_snapshot()"""
+    _pinned_settings.reset(token)
+
+def settings_version():
+    """(mtime_ns, size) of the settings.ini the current settings snapshot was read from"""
+    return getattr(_load_settings(), 'stamp', None)
 
 def get_setting(section, key, fallback=None, type_=str):
     """Get a setting from settings.ini, converting to the specified type"""
-    config = CaseSensitiveConfigParser()
-    config.read(CONFIG_FILE)
+    config = _load_settings()
     
     try:
         section = section.upper()
@@ -218,24 +328,40 @@ def get_setting(section, key, fallback=None, type_=str):
         print(f"Error getting setting {section}.{key}: {str(e)}")
         return fallback
 
-def set_setting(section, key, value):
-    """Set a setting in settings.ini"""
-    config = CaseSensitiveConfigParser()
-    config.read(CONFIG_FILE)
-    
+def set_settings(section, mapping):
+    """
+    Set several settings of one section in settings.ini in a single write.
+    The file is replaced atomically and the new snapshot is published only
+    once it is on disk; requests that pinned the old snapshot keep using it.
+    Returns True on success, False if nothing was written.
+    """
+    section = section.upper()
     try:
-        section = section.upper()
-        key = key.upper()
-        if not config.has_section(section):
-            config.add_section(section)
-        config.set(section, key, str(value))
-        with open(CONFIG_FILE, 'w') as f:
-            config.write(f)
+        with _settings_write_lock:
+            config = CaseSensitiveConfigParser()
+            config.read(CONFIG_FILE)
+            if not config.has_section(section):
+                config.add_section(section)
+            for key, value in mapping.items():
+                config.set(section, key.upper(), str(value))
+            _atomic_write(config.write)
+            # Publish the parser we just wrote so readers don't have to re-parse it
+            config.stamp = _settings_file_stamp()
+            with _settings_lock:
+                _settings_cache['config'] = config
+                _settings_cache['stamp'] = config.stamp
+        # The writing request should see its own changes
+        if _pinned_settings.get() is not None:
+            _pinned_settings.set(config)
         return True
     except Exception as e:
-        print(f"Error setting {section}.{key}: {str(e)}")
+        print(f"Error setting {section}.{', '.join(mapping)}: {str(e)}")
         return False
 
+def set_setting(section, key, value):
+    """Set a setting in settings.ini"""
+    return set_settings(section, {key: value})
+
 # Load settings from the configuration file settings.ini
 FLASK_HOST = get_setting('FLASK', 'FLASK_HOST', fallback='0.0.0.0')
 FLASK_PORT = get_setting('FLASK', 'FLASK_PORT', fallback=5000, type_=int)
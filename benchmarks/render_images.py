@@ -0,0 +1,62 @@
+"""
+Per-image cost of rendering a note with many images.
+
+Compares the old way (new ObsidianRenderer + mistune.Markdown per request,
+settings read per image) with the shared per-thread render engine.
+
+    python benchmarks/render_images.py [images] [repeat]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mistune  # noqa: E402
+from app import app  # noqa: E402
+from app_settings_loader import get_setting  # noqa: E402
+from md_viewer.support_functions import (  # noqa: E402
+    ObsidianRenderer, get_image_storage_info, render_markdown,
+)
+
+
+class PerImageSettingsRenderer(ObsidianRenderer):
+    """Reproduces the previous behaviour: settings resolved again for every image."""
+
+    def image(self, *args, **kwargs):
+        get_image_storage_info(self.note_path)
+        get_setting('MD_NOTES_APP', 'IMAGE_STORAGE_MODE')
+        return super().image(*args, **kwargs)
+
+
+def render_per_request(content, note_path):
+    renderer = PerImageSettingsRenderer(note_path=note_path)
+    return mistune.Markdown(renderer=renderer)(content)
+
+
+def timed(func, content, note_path, repeat):
+    func(content, note_path)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(content, note_path)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    images = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    content = '\n\n'.join(f'Screenshot {i}\n\n![Pasted image {i}](Pasted_image_{i}.png)'
+                          for i in range(images))
+    note_path = 'bench/note.md'
+
+    with app.test_request_context():
+        old = timed(render_per_request, content, note_path, repeat)
+        new = timed(render_markdown, content, note_path, repeat)
+
+    print(f'{images} images, {repeat} renders each')
+    print(f'per request renderer : {old * 1000:8.2f} ms/note  {old / images * 1e6:8.1f} us/image')
+    print(f'shared render engine : {new * 1000:8.2f} ms/note  {new / images * 1e6:8.1f} us/image')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Many files in one upload request.
+
+save_batch() checks the type of every file of a multipart request and saves
+the ones that pass on a small thread pool (UPLOAD_WORKERS), so a folder of
+hundreds of attachments costs one request and runs libmagic on several files
+at a time instead of one request, settings read and detection per file. The
+result is a manifest with one entry per file, in request order.
+
+Names and extensions are checked by the caller (once per request, not once
+per file); files whose name was rejected are passed in with their error.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from app_settings_loader import get_setting
+from md_viewer.support_functions import MAGIC_HEADER_BYTES, verify_file_header
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, get_setting('MD_NOTES_APP', 'UPLOAD_WORKERS', fallback=4, type_=int)),
+    thread_name_prefix='upload')
+
+
+def _validate_and_save(file, filename, upload_folder):
+    """Worker: check one file's content against its extension and save it. Returns (final_path, error)."""
+    try:
+        header = file.stream.read(MAGIC_HEADER_BYTES)
+        file.stream.seek(0)
+        file_ext = os.path.splitext(filename)[1].lower()
+        is_valid, actual_type = verify_file_header(header, file_ext)
+        if not is_valid:
+            return None, (f'File content does not match its extension. '
+                          f'Claimed: {file_ext}, Detected: {actual_type}')
+
+        # Save under a temporary name, then move to the final location
+        temp_path = os.path.join(upload_folder, f'temp_{filename}')
+        file.save(temp_path)
+        final_path = os.path.join(upload_folder, filename)
+        os.replace(temp_path, final_path)
+        return final_path, None
+    except Exception as e:
+        return None, str(e)
+
+
+def save_batch(entries, upload_folder):
+    """
+    Validate and save files into upload_folder (which must exist). entries
+    are (file, filename, error) with error set for files rejected by name.
+    Returns a list of {'name', 'filename', 'path', 'error'} in the same
+    order; path is None for files that were not saved.
+    """
+    jobs = []  # (result, future or None)
+    seen = set()
+    for file, filename, error in entries:
+        if error is None and filename in seen:
+            error = 'Another file in this upload has the same name'
+        future = None
+        if error is None:
+            seen.add(filename)
+            future = _executor.submit(_validate_and_save, file, filename, str(upload_folder))
+        jobs.append(({'name': file.filename, 'filename': filename, 'path': None, 'error': error}, future))
+
+    for file_result, future in jobs:
+        if future is not None:
+            file_result['path'], file_result['error'] = future.result()
+    return [file_result for file_result, _ in jobs]
@@ -0,0 +1,203 @@
+"""
+Chunked, resumable uploads.
+
+Large files are sent in numbered chunks of UPLOAD_CHUNK_SIZE_MB, each in its
+own request (so MAX_CONTENT_LENGTH only limits a chunk) with an optional
+X-Chunk-SHA256 header that is checked before the chunk is kept:
+
+    POST   /upload/chunked                 {filename, folder, size} -> {upload_id, chunk_size, chunks}
+    GET    /upload/chunked/<id>            -> {received: [chunk indexes], ...}  (to resume)
+    PUT    /upload/chunked/<id>/<index>    raw chunk bytes
+    POST   /upload/chunked/<id>/complete   {sha256 (optional)} -> file moved into the vault
+    DELETE /upload/chunked/<id>
+
+The upload's state lives on disk in UPLOAD_TEMP_DIR/<id> (meta.json and one
+file per received chunk), so a client can resume after a dropped connection
+or an app restart, and any worker process can take any chunk. The file type
+is checked once, on the header bytes of chunk 0; a chunk 0 that does not match
+the extension cancels the upload. complete() joins the chunks into the target
+folder. Uploads left unfinished for CHUNKED_UPLOAD_EXPIRE_HOURS are removed.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from app_settings_loader import ROOT_DIR, get_setting
+from md_viewer.support_functions import resolve_path, verify_file_header
+
+UPLOAD_TEMP_DIR = resolve_path(
+    get_setting('MD_NOTES_APP', 'UPLOAD_TEMP_DIR', fallback='upload_temp'), ROOT_DIR)
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """A chunked upload request that can't be accepted (message is shown to the user)."""
+
+
+def upload_chunk_size(max_request_bytes=None):
+    """Chunk size in bytes, kept below the request size limit."""
+    chunk_size = get_setting('MD_NOTES_APP', 'UPLOAD_CHUNK_SIZE_MB', fallback=4, type_=int) * 1024 * 1024
+    if max_request_bytes:
+        # Leave room for the request's own overhead
+        chunk_size = min(chunk_size, max_request_bytes - 64 * 1024)
+    return max(chunk_size, 64 * 1024)
+
+
+def max_upload_size():
+    """Largest file accepted by chunked upload, in bytes."""
+    return get_setting('MD_NOTES_APP', 'CHUNKED_UPLOAD_MAX_MB', fallback=2048, type_=int) * 1024 * 1024
+
+
+def _upload_dir(upload_id):
+    return os.path.join(UPLOAD_TEMP_DIR, upload_id)
+
+
+def _chunk_path(upload_id, index):
+    return os.path.join(_upload_dir(upload_id), f'{index}.part')
+
+
+def _chunk_length(meta, index):
+    """Expected length of chunk index."""
+    if index < meta['chunks'] - 1:
+        return meta['chunk_size']
+    return meta['size'] - meta['chunk_size'] * (meta['chunks'] - 1)
+
+
+def cleanup_stale_uploads():
+    """Remove uploads that got no chunk for CHUNKED_UPLOAD_EXPIRE_HOURS."""
+    max_age = get_setting('MD_NOTES_APP', 'CHUNKED_UPLOAD_EXPIRE_HOURS', fallback=24, type_=int) * 3600
+    try:
+        entries = list(os.scandir(UPLOAD_TEMP_DIR))
+    except FileNotFoundError:
+        return
+    now = time.time()
+    for entry in entries:
+        try:
+            if entry.is_dir() and now - entry.stat().st_mtime > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def start_upload(filename, folder, size, chunk_size):
+    """Create a new upload (filename and folder already checked) and return its metadata."""
+    if size < 0 or size > max_upload_size():
+        raise UploadError(f'File too large (max {max_upload_size() // (1024 * 1024)} MB)')
+    cleanup_stale_uploads()
+    meta = {
+        'upload_id': uuid.uuid4().hex,
+        'filename': filename,
+        'folder': folder,
+        'size': size,
+        'chunk_size': chunk_size,
+        # An empty file is still one (empty) chunk, which gets the type check
+        'chunks': max(1, -(-size // chunk_size)),
+        'created': time.time(),
+    }
+    os.makedirs(_upload_dir(meta['upload_id']))
+    with open(os.path.join(_upload_dir(meta['upload_id']), 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def load_upload(upload_id):
+    """Metadata of an upload in progress, or None."""
+    if not UPLOAD_ID_RE.match(upload_id):
+        return None
+    try:
+        with open(os.path.join(_upload_dir(upload_id), 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def received_chunks(meta):
+    """Sorted indexes of the chunks stored so far."""
+    received = []
+    for name in os.listdir(_upload_dir(meta['upload_id'])):
+        stem, ext = os.path.splitext(name)
+        if ext == '.part' and stem.isdigit():
+            received.append(int(stem))
+    return sorted(received)
+
+
+def upload_status(meta):
+    return {
+        'upload_id': meta['upload_id'],
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'chunk_size': meta['chunk_size'],
+        'chunks': meta['chunks'],
+        'received': received_chunks(meta),
+    }
+
+
+def save_chunk(meta, index, data, sha256=None):
+    """
+    Store chunk index of an upload. Sending a chunk again replaces it. Chunk 0
+    is checked to be of the file's type; if it isn't the upload is cancelled.
+    """
+    if not 0 <= index < meta['chunks']:
+        raise UploadError(f'Chunk {index} out of range (0-{meta["chunks"] - 1})')
+    if len(data) != _chunk_length(meta, index):
+        raise UploadError(f'Chunk {index} has {len(data)} bytes, expected {_chunk_length(meta, index)}')
+    if sha256 and hashlib.sha256(data).hexdigest() != sha256.strip().lower():
+        raise UploadError(f'Checksum mismatch in chunk {index}')
+
+    if index == 0:
+        file_ext = os.path.splitext(meta['filename'])[1].lower()
+        is_valid, actual_type = verify_file_header(data, file_ext)
+        if not is_valid:
+            abort_upload(meta)
+            raise UploadError(f'File content does not match its extension. '
+                              f'Claimed: {file_ext}, Detected: {actual_type}')
+
+    path = _chunk_path(meta['upload_id'], index)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def complete_upload(meta, target_folder, sha256=None):
+    """
+    Join the chunks into target_folder/<filename> and remove the upload.
+    Returns the final path.
+    """
+    missing = sorted(set(range(meta['chunks'])) - set(received_chunks(meta)))
+    if missing:
+        raise UploadError(f'Missing chunks: {", ".join(str(i) for i in missing[:20])}')
+
+    os.makedirs(target_folder, exist_ok=True)
+    temp_path = os.path.join(target_folder, f"temp_{meta['upload_id']}_{meta['filename']}")
+    digest = hashlib.sha256()
+    try:
+        with open(temp_path, 'wb') as out:
+            for index in range(meta['chunks']):
+                with open(_chunk_path(meta['upload_id'], index), 'rb') as chunk:
+                    while True:
+                        data = chunk.read(COPY_BUFFER_SIZE)
+                        if not data:
+                            break
+                        digest.update(data)
+                        out.write(data)
+        if sha256 and digest.hexdigest() != sha256.strip().lower():
+            raise UploadError('Checksum of the assembled file does not match')
+        final_path = os.path.join(target_folder, meta['filename'])
+        os.replace(temp_path, final_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    abort_upload(meta)
+    return final_path
+
+
+def abort_upload(meta):
+    """Drop an upload and its chunks."""
+    shutil.rmtree(_upload_dir(meta['upload_id']), ignore_errors=True)
@@ -0,0 +1,102 @@
+"""
+Response compression.
+
+compress_response() (an after_request hook) gzips - or brotli-compresses if
+the brotli package is installed and the client accepts it - text responses
+of at least COMPRESS_MIN_SIZE bytes. Files sent with send_from_directory and
+streamed responses are left alone; fingerprinted assets have precompressed
+variants on disk (see static_assets).
+
+Compressed note pages are also kept in compressed_pages, keyed by the page's
+ETag, so a repeated view of an unchanged note costs neither rendering nor
+compression (cached_compressed_page()).
+"""
+import gzip
+
+from flask import current_app, g, request, session
+
+from app_settings_loader import get_setting
+from md_viewer.render_cache import RenderedNoteCache
+from md_viewer.support_functions import encoded_etag, set_validators
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/xml', 'text/csv', 'text/markdown',
+    'application/json', 'application/javascript', 'text/javascript', 'application/xml',
+    'image/svg+xml',
+}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # fast enough for dynamic responses
+
+compressed_pages = RenderedNoteCache(
+    get_setting('MD_NOTES_APP', 'COMPRESSED_CACHE_MB', fallback=32, type_=int) * 1024 * 1024)
+
+
+def negotiate_encoding():
+    """Best content coding the client accepts: 'br', 'gzip' or None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    """Compress bytes with 'gzip' or 'br'."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def cached_compressed_page(key, etag, last_modified=None):
+    """
+    Return a response with the compressed page stored for key and etag in the
+    client's preferred coding, or None. On a miss the page rendered by this
+    request is stored under key by compress_response().
+    """
+    if (not get_setting('MD_NOTES_APP', 'COMPRESS_RESPONSES', fallback=True, type_=bool)
+            or session.get('_flashes')):
+        return None
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return None
+    entry = compressed_pages.get(key + (encoding,), etag)
+    if entry is None:
+        g.compressed_page_key = key
+        return None
+    mimetype, body = entry
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.update(('X-Fragment', 'Accept-Encoding'))
+    return set_validators(response, encoded_etag(etag, encoding), last_modified)
+
+
+def compress_response(response):
+    """after_request hook: compress text responses the client can decode."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES
+            or not get_setting('MD_NOTES_APP', 'COMPRESS_RESPONSES', fallback=True, type_=bool)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < get_setting('MD_NOTES_APP', 'COMPRESS_MIN_SIZE', fallback=1024, type_=int):
+        return response
+
+    body = compress(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+        key = g.pop('compressed_page_key', None)
+        if key is not None and not weak:
+            compressed_pages.put(key + (encoding,), etag, (response.mimetype, body), size=len(body))
+    return response
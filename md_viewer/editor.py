@@ -6,10 +6,13 @@ import os
 from pathlib import Path
 import re
 from md_viewer.support_functions import (
-    build_tree_structure, get_path_components, generate_breadcrumbs, 
+    get_notes_tree, get_path_components, generate_breadcrumbs, 
     get_all_folders, get_image_storage_info, handle_uploaded_image,
-    as_path, NOTES_FOLDER
+    as_path, invalidate_notes_tree, note_links, NOTES_FOLDER
 )
+from md_viewer.search_index import update_note as update_search_index, remove_note as remove_from_search_index
+from md_viewer.link_graph import update_note as update_link_graph, remove_note as remove_from_link_graph
+from md_viewer.render_cache import rendered_notes
 from md_viewer import md_viewer_bp
 
 
@@ -24,6 +27,10 @@ def edit_note(note_path):
         try:
             with open(full_path, 'w', encoding='utf-8') as f:
                 f.write(new_content)
+            invalidate_notes_tree(note_path)
+            update_search_index(note_path)
+            update_link_graph(note_path)
+            rendered_notes.invalidate(note_path)
             
             # Check if it's an AJAX request
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -40,7 +47,7 @@ def edit_note(note_path):
         with open(full_path, 'r', encoding='utf-8') as f:
             content = f.read()
             title = full_path.stem
-        notes_tree = build_tree_structure(NOTES_FOLDER)
+        notes_tree = get_notes_tree()
         active_path = get_path_components(note_path)
         breadcrumbs = generate_breadcrumbs(note_path, f"Edit {title}")
         note_dir = os.path.dirname(note_path)
@@ -106,8 +113,12 @@ def create_note():
 
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(content)
+            invalidate_notes_tree(file_path)
             # Use os.path.relpath for robust path calculation
             rel_path = os.path.relpath(str(file_path), str(NOTES_FOLDER))
+            update_search_index(rel_path)
+            note_links.add(rel_path)
+            update_link_graph(rel_path)
             return redirect(url_for('md_viewer.note', note_path=rel_path))
         except Exception as e:
             abort(500, description=f"Error creating note: {str(e)}")
@@ -118,7 +129,7 @@ def create_note():
     # Get current folder from query parameter if provided
     current_folder = request.args.get('folder', '')
     
-    notes_tree = build_tree_structure(NOTES_FOLDER)
+    notes_tree = get_notes_tree()
     return render_template('create.html', 
                          notes_tree=notes_tree,
                          available_folders=available_folders,
@@ -134,6 +145,11 @@ def delete_note(note_path):
 
     try:
         os.remove(full_path)
+        invalidate_notes_tree(note_path)
+        remove_from_search_index(note_path)
+        note_links.remove(note_path)
+        remove_from_link_graph(note_path)
+        rendered_notes.invalidate(note_path)
         return redirect(url_for('md_viewer.index'))
     except Exception as e:
         return f"Error deleting note: {str(e)}", 500
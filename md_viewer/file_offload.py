@@ -0,0 +1,106 @@
+"""
+Hand file transfers to the front proxy.
+
+With FILE_OFFLOAD = x-sendfile (Apache mod_xsendfile, lighttpd) or
+x-accel-redirect (nginx) the routes that send files - downloads, /view,
+attached and stored images, thumbnails - still do all their path and security
+checks, but the response carries only a header naming the file and the proxy
+sends it with sendfile(), so no Python worker is busy for the transfer.
+
+Both modes use Flask's USE_X_SENDFILE, which makes send_from_directory() set an
+X-Sendfile header with the absolute path instead of a body (for Apache, limit
+it with XSendFilePath). For nginx offload_response() turns it into
+X-Accel-Redirect: FILE_OFFLOAD_PREFIX/<root>/<path relative to the root>, where
+the roots are the vault, the image storage folder, the thumbnail cache and
+the asset bundles (offload_roots()), each an `internal` location aliased to
+that folder only (see deploy/nginx.conf). Files outside those folders are
+sent by the app. The proxy handles Range requests itself. Responses with a Content-Encoding
+(precompressed assets) are sent by the app, since nginx drops that header on
+an internal redirect.
+
+Only read at startup - restart the app after changing these settings.
+"""
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+from app_settings_loader import ROOT_DIR, get_setting
+from md_viewer import static_assets
+from md_viewer.support_functions import NOTES_FOLDER, resolve_path
+from md_viewer.thumbnails import THUMBNAIL_CACHE_DIR
+
+OFFLOAD_MODES = ('off', 'x-sendfile', 'x-accel-redirect')
+
+FILE_OFFLOAD = get_setting('MD_NOTES_APP', 'FILE_OFFLOAD', fallback='off').strip().lower()
+FILE_OFFLOAD_PREFIX = '/' + get_setting('MD_NOTES_APP', 'FILE_OFFLOAD_PREFIX',
+                                        fallback='/_offload').strip().strip('/')
+
+
+def init_file_offload(app):
+    """Enable the configured offload mode on the app."""
+    if FILE_OFFLOAD not in OFFLOAD_MODES:
+        print(f"Unknown FILE_OFFLOAD '{FILE_OFFLOAD}', files are sent by the app")
+        return
+    if FILE_OFFLOAD == 'off':
+        return
+    app.config['USE_X_SENDFILE'] = True
+    app.after_request(offload_response)
+    print(f"Sending files through the proxy ({FILE_OFFLOAD})")
+
+
+def offload_roots():
+    """Folders the proxy sends files from, by the name used in X-Accel-Redirect."""
+    roots = {'notes': NOTES_FOLDER, 'thumbnails': THUMBNAIL_CACHE_DIR, 'assets': static_assets.DIST_DIR}
+    storage_path = get_setting('MD_NOTES_APP', 'IMAGE_STORAGE_PATH', fallback='')
+    if storage_path:
+        roots['images'] = resolve_path(storage_path, ROOT_DIR)
+    return roots
+
+
+def accel_redirect_uri(file_path):
+    """X-Accel-Redirect URI of a file, or None if it is in none of the offload roots."""
+    real_path = Path(os.path.realpath(file_path))
+    for name, root in offload_roots().items():
+        try:
+            rel_path = real_path.relative_to(os.path.realpath(root))
+        except ValueError:
+            continue
+        return quote(f'{FILE_OFFLOAD_PREFIX}/{name}/{rel_path.as_posix()}')
+    return None
+
+
+def _send_from_app(response, file_path):
+    """Drop the offload header and send the file from the app."""
+    del response.headers['X-Sendfile']
+    if response.status_code in (200, 206):
+        response.direct_passthrough = False
+        with open(file_path, 'rb') as f:
+            response.set_data(f.read())
+        response.status_code = 200
+        response.headers.pop('Content-Range', None)
+    return response
+
+
+def offload_response(response):
+    """after_request hook: leave a file response with only the offload header."""
+    file_path = response.headers.get('X-Sendfile')
+    if file_path is None:
+        return response
+    if response.status_code not in (200, 206) or 'Content-Encoding' in response.headers:
+        # 304s need no file; encoded variants can't be offloaded - send the body here
+        return _send_from_app(response, file_path)
+    redirect_uri = None
+    if FILE_OFFLOAD == 'x-accel-redirect':
+        redirect_uri = accel_redirect_uri(file_path)
+        if redirect_uri is None:
+            # The proxy only serves the offload roots
+            return _send_from_app(response, file_path)
+
+    # The proxy answers Range requests from the file itself
+    response.status_code = 200
+    response.headers.pop('Content-Range', None)
+    response.headers.pop('Content-Length', None)
+    if FILE_OFFLOAD == 'x-accel-redirect':
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = redirect_uri
+    return response
@@ -0,0 +1,222 @@
+"""
+Backlinks and outgoing links between notes.
+
+Every note is parsed for [[wikilinks]] once per mtime/size; the link targets
+are kept as written and resolved to notes through note_links. Edges are stored
+as interned note ids (int arrays for outgoing links, int sets for backlinks),
+so a path string is stored once no matter how many notes link to it. When
+notes are added or removed (note_links.version changes) only the notes with
+a link by one of the changed names (note_links.changed_names()) are resolved
+again, without reading any file.
+
+Like the search index the graph is built in a background thread at startup,
+kept up to date by the routes that change notes and reconciled with the
+vault (stat only) at most every REFRESH_INTERVAL seconds.
+"""
+from array import array
+import re
+import sys
+import time
+
+from md_viewer.note_index import NoteFileIndex
+from md_viewer.support_functions import NOTES_FOLDER, WIKILINK_PATTERN, note_links
+
+WIKILINK_RE = re.compile(WIKILINK_PATTERN)
+# Links inside code are not links
+CODE_RE = re.compile(r'^(`{3,}|~{3,}).*?^\1|`[^`\n]*`', re.MULTILINE | re.DOTALL)
+
+
+def extract_link_targets(content):
+    """Return the distinct [[wikilink]] targets of a note, in order of appearance."""
+    targets = {}
+    for m in WIKILINK_RE.finditer(CODE_RE.sub('', content)):
+        target = m.group('wikilink_target').strip()
+        if target:
+            targets.setdefault(target, None)
+    return tuple(sys.intern(t) for t in targets)
+
+
+class LinkGraph(NoteFileIndex):
+    """Bidirectional note link index over the .md files of a folder."""
+
+    THREAD_NAME = 'link-graph'
+
+    def __init__(self, root):
+        super().__init__(root)
+        self._paths = []        # note id -> relative path
+        self._ids = {}          # relative path -> note id
+        self._stamps = {}       # note id -> (mtime_ns, size) of parsed notes
+        self._targets = {}      # note id -> link targets as written
+        self._out = {}          # note id -> array of linked note ids
+        self._in = {}           # note id -> set of ids of notes linking to it
+        self._by_name = {}      # lookup name of a target -> ids of notes linking by it
+        self._links_version = None  # note_links.version the edges were resolved with
+        self._graph = None      # cached graph() result
+
+    def _intern_locked(self, rel_path):
+        note_id = self._ids.get(rel_path)
+        if note_id is None:
+            note_id = self._ids[rel_path] = len(self._paths)
+            self._paths.append(rel_path)
+        return note_id
+
+    # Building and updating
+
+    def build(self):
+        """Parse every note in the folder (replaces any existing content)."""
+        with self._lock:
+            self._paths, self._ids, self._stamps = [], {}, {}
+            self._targets, self._out, self._in, self._by_name = {}, {}, {}, {}
+            self._links_version, self._graph = None, None
+        for rel_path, st in self._iter_notes():
+            self._parse_file(rel_path, st)
+        self._last_refresh = time.monotonic()
+        self._ready.set()
+
+    def _parse_file(self, rel_path, st=None):
+        content, st = self._read_note(rel_path, st)
+        if content is None:
+            self.remove_note(rel_path)
+            return
+        targets = extract_link_targets(content)
+        with self._lock:
+            note_id = self._intern_locked(rel_path)
+            self._stamps[note_id] = (st.st_mtime_ns, st.st_size)
+            self._set_targets_locked(note_id, targets)
+            if self._links_version is not None:
+                self._link_locked(note_id)
+
+    def _set_targets_locked(self, note_id, targets):
+        """Replace a note's link targets (None removes them) and the name map."""
+        for target in self._targets.pop(note_id, ()):
+            sources = self._by_name.get(note_links.lookup_name(target))
+            if sources is not None:
+                sources.discard(note_id)
+                if not sources:
+                    del self._by_name[note_links.lookup_name(target)]
+        if targets is not None:
+            self._targets[note_id] = targets
+            for target in targets:
+                self._by_name.setdefault(note_links.lookup_name(target), set()).add(note_id)
+
+    def _link_locked(self, note_id):
+        """Resolve the targets of one note and update both directions."""
+        self._unlink_locked(note_id)
+        from_path = self._paths[note_id]
+        linked = set()
+        for target in self._targets.get(note_id, ()):
+            path = note_links.resolve(target, from_path)
+            if path is not None and path != from_path:
+                linked.add(self._intern_locked(path))
+        self._out[note_id] = array('I', sorted(linked))
+        for target_id in linked:
+            self._in.setdefault(target_id, set()).add(note_id)
+        self._graph = None
+
+    def _unlink_locked(self, note_id):
+        for target_id in self._out.pop(note_id, ()):
+            sources = self._in.get(target_id)
+            if sources is not None:
+                sources.discard(note_id)
+                if not sources:
+                    del self._in[target_id]
+        self._graph = None
+
+    def _relink_if_needed_locked(self):
+        """Resolve the targets affected by notes added or removed since the last call."""
+        version = note_links.version
+        if self._links_version == version:
+            return
+        changed = None if self._links_version is None else note_links.changed_names(self._links_version)
+        self._links_version = version
+        if changed is None:
+            # First use, or too many changes to tell - resolve everything
+            self._out, self._in = {}, {}
+            sources = list(self._targets)
+        else:
+            sources = set()
+            for name in changed:
+                sources.update(self._by_name.get(name, ()))
+        for note_id in sources:
+            self._link_locked(note_id)
+
+    def _remove_locked(self, rel_path):
+        note_id = self._ids.get(rel_path)
+        if note_id is None or note_id not in self._stamps:
+            return
+        self._unlink_locked(note_id)
+        del self._stamps[note_id]
+        self._set_targets_locked(note_id, None)
+
+    def update_note(self, rel_path):
+        """(Re-)parse one note, path relative to the notes folder."""
+        rel_path = str(rel_path).replace('\\', '/')
+        if rel_path.endswith('.md'):
+            self._parse_file(rel_path)
+
+    def remove_note(self, rel_path):
+        """Drop one note's links."""
+        with self._lock:
+            self._remove_locked(str(rel_path).replace('\\', '/'))
+
+    def refresh(self):
+        """Re-parse notes whose mtime/size changed on disk and drop deleted ones."""
+        seen = set()
+        for rel_path, st in self._iter_notes():
+            seen.add(rel_path)
+            with self._lock:
+                note_id = self._ids.get(rel_path)
+                stamp = self._stamps.get(note_id) if note_id is not None else None
+            if stamp != (st.st_mtime_ns, st.st_size):
+                self._parse_file(rel_path, st)
+        with self._lock:
+            for note_id in [i for i in self._stamps if self._paths[i] not in seen]:
+                self._remove_locked(self._paths[note_id])
+        self._last_refresh = time.monotonic()
+
+    # Querying
+
+    def backlinks(self, rel_path):
+        """Paths of the notes linking to rel_path, sorted."""
+        with self._lock:
+            self._relink_if_needed_locked()
+            note_id = self._ids.get(rel_path)
+            sources = self._in.get(note_id, ()) if note_id is not None else ()
+            return sorted(self._paths[i] for i in sources)
+
+    def outgoing(self, rel_path):
+        """Paths of the notes rel_path links to, sorted."""
+        with self._lock:
+            self._relink_if_needed_locked()
+            note_id = self._ids.get(rel_path)
+            targets = self._out.get(note_id, ()) if note_id is not None else ()
+            return sorted(self._paths[i] for i in targets)
+
+    def graph(self):
+        """
+        Whole-vault adjacency list: {'nodes': [paths], 'links': [[node indexes]]},
+        links[i] are the notes nodes[i] links to. Cached until a link changes.
+        """
+        with self._lock:
+            self._relink_if_needed_locked()
+            if self._graph is None:
+                node_ids = sorted(self._stamps, key=lambda i: self._paths[i])
+                index = {note_id: i for i, note_id in enumerate(node_ids)}
+                self._graph = {
+                    'nodes': [self._paths[i] for i in node_ids],
+                    'links': [[index[t] for t in self._out.get(i, ()) if t in index] for i in node_ids],
+                }
+            return self._graph
+
+
+link_graph = LinkGraph(NOTES_FOLDER)
+
+
+def update_note(rel_path):
+    """Re-parse a note after it was created, edited or uploaded."""
+    link_graph.update_note(rel_path)
+
+
+def remove_note(rel_path):
+    """Drop a deleted note from the graph."""
+    link_graph.remove_note(rel_path)
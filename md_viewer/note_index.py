@@ -0,0 +1,85 @@
+"""
+Base class of the indexes built over every note of the vault (full-text
+search, link graph).
+
+NoteFileIndex holds what they share: walking the notes, reading one note,
+building in a background thread at startup and reconciling with the vault
+(stat only) at most every REFRESH_INTERVAL seconds. Subclasses implement
+build() and refresh() and their own incremental updates.
+"""
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
+
+from md_viewer.support_functions import iter_vault_notes
+
+
+class NoteFileIndex(ABC):
+    """An index over the .md files of a folder, built and refreshed in the background."""
+
+    REFRESH_INTERVAL = 60  # seconds between checks for notes changed outside the app
+    THREAD_NAME = 'note-index'
+
+    def __init__(self, root):
+        self.root = str(root)
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._last_refresh = 0.0
+        self._refreshing = False
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def _iter_notes(self):
+        """Yield (relative path, stat) of every indexable .md file."""
+        return iter_vault_notes(self.root)
+
+    def _read_note(self, rel_path, st=None):
+        """Return (content, stat) of a note, or (None, None) if it can't be read."""
+        full_path = os.path.join(self.root, rel_path)
+        try:
+            if st is None:
+                st = os.stat(full_path)
+            with open(full_path, 'r', encoding='utf-8') as f:
+                return f.read(), st
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error indexing {full_path}: {str(e)}")
+            return None, None
+
+    @abstractmethod
+    def build(self):
+        """Index every note of the vault."""
+
+    def build_in_background(self):
+        """Start build() in a daemon thread."""
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                print(f"Error building {type(self).__name__} for {self.root}: {str(e)}")
+        thread = threading.Thread(target=run, name=f'{self.THREAD_NAME}-build', daemon=True)
+        thread.start()
+        return thread
+
+    @abstractmethod
+    def refresh(self):
+        """Bring the index up to date with notes changed outside the app."""
+
+    def refresh_if_stale(self):
+        """Run refresh() in the background if the last one is older than REFRESH_INTERVAL."""
+        with self._lock:
+            if (self._refreshing or not self.ready or
+                    time.monotonic() - self._last_refresh < self.REFRESH_INTERVAL):
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing {type(self).__name__} for {self.root}: {str(e)}")
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, name=f'{self.THREAD_NAME}-refresh', daemon=True).start()
@@ -0,0 +1,144 @@
+"""
+LRU cache of rendered note HTML.
+
+Entries are stored per note path together with the identity they were
+rendered from: the file's mtime and size, the settings that change the
+output of ObsidianRenderer.image and the URL prefix the app is mounted
+under. A lookup with a different identity is a miss, so edits made outside
+the app never serve stale HTML; edits through the app drop the entry right
+away. The cache is bounded by the size of the stored HTML (RENDER_CACHE_MB
+setting, 0 disables it).
+
+Apart from the HTML, every rendered note keeps how its links and embeds were
+resolved (LinkDependencies), also when its HTML was evicted or is not cached:
+adding or removing a file only invalidates the notes with a link that now
+resolves differently, and viewer.note builds its ETag from them without
+reading or rendering the note.
+"""
+from collections import OrderedDict
+import threading
+
+from flask import has_request_context, request
+
+from app_settings_loader import get_setting
+
+
+def image_render_settings():
+    """Settings that change how ObsidianRenderer renders image links."""
+    return tuple(get_setting('MD_NOTES_APP', key, fallback='') for key in (
+        'IMAGE_STORAGE_MODE', 'IMAGE_STORAGE_PATH', 'IMAGE_SUBFOLDER_NAME', 'NOTES_DIR_SKIP'))
+
+
+def note_identity(stat_result):
+    """
+    Cache identity of a note file: (mtime_ns, size, image settings, script
+    root). The script root is the prefix url_for() puts on every link, which
+    differs when the app is mounted under a path.
+    """
+    script_root = request.script_root if has_request_context() else ''
+    return (stat_result.st_mtime_ns, stat_result.st_size, image_render_settings(), script_root)
+
+
+class RenderedNoteCache:
+    """Byte-bounded LRU of note path -> (identity, html), plus the links of every rendered note."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # note path -> (identity, html, size in bytes)
+        self._links = {}  # note path -> (identity, LinkDependencies)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _current_links_locked(self, note_path, identity):
+        """LinkDependencies of note_path rendered from identity if still valid, else None."""
+        entry = self._links.get(note_path)
+        if entry is None or entry[0] != identity:
+            return None
+        links = entry[1].current()
+        if links is None:
+            # One of its links now resolves to another file (or none)
+            self._drop_locked(note_path)
+        elif links is not entry[1]:
+            self._links[note_path] = (identity, links)
+        return links
+
+    def links(self, note_path, identity):
+        """
+        Return the LinkDependencies note_path was last rendered with if it was
+        rendered from identity and its links still resolve the same, else None.
+        """
+        with self._lock:
+            return self._current_links_locked(note_path, identity)
+
+    def get(self, note_path, identity):
+        """
+        Return the cached HTML for note_path if it was rendered from identity
+        and, if it was stored with links, they still resolve the same.
+        """
+        with self._lock:
+            entry = self._entries.get(note_path)
+            if (entry is not None and note_path in self._links and
+                    self._current_links_locked(note_path, identity) is None):
+                entry = None
+            if entry is None or entry[0] != identity:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(note_path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, note_path, identity, html, size=None, links=None):
+        """
+        Store rendered HTML and the LinkDependencies it was rendered with,
+        evicting the least recently used notes if needed. The links are kept
+        even if the HTML is too large to cache. Other values can be stored if
+        their size in bytes is given.
+        """
+        if size is None:
+            size = len(html.encode('utf-8'))
+        with self._lock:
+            self._drop_locked(note_path)
+            if links is not None:
+                self._links[note_path] = (identity, links)
+            if size > self.max_bytes:
+                return
+            self._entries[note_path] = (identity, html, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def _drop_locked(self, note_path):
+        self._links.pop(note_path, None)
+        old = self._entries.pop(note_path, None)
+        if old is not None:
+            self._bytes -= old[2]
+
+    def invalidate(self, note_path=None):
+        """Drop one note, or everything if note_path is None."""
+        with self._lock:
+            if note_path is None:
+                self._entries.clear()
+                self._links.clear()
+                self._bytes = 0
+                return
+            self._drop_locked(note_path)
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+rendered_notes = RenderedNoteCache(
+    get_setting('MD_NOTES_APP', 'RENDER_CACHE_MB', fallback=64, type_=int) * 1024 * 1024)
@@ -0,0 +1,442 @@
+"""
+In-memory full-text search index for the notes folder.
+
+The index maps every term to its postings (note id -> term positions), so a
+search only touches the notes that contain the query terms instead of reading
+the whole vault. It is built once in a background thread at startup and kept
+up to date by the routes that change notes (update_note / remove_note).
+Changes made outside the app (e.g. Obsidian sync) are picked up by a
+stat-only reconcile that runs at most every REFRESH_INTERVAL seconds
+(see note_index.NoteFileIndex).
+
+Two backends implement the same interface: SearchIndex keeps the postings in
+memory, SqliteSearchIndex keeps them in an SQLite FTS5 file so a restarted
+worker only re-reads notes that changed (SEARCH_BACKEND setting).
+
+Query semantics: the query is split into words which must appear next to each
+other in the note (a phrase); the last word is matched as a prefix so results
+show up while typing. If no note matches that way, the query is matched as a
+substring like the plain vault scan did, also inside words ("orld" finds
+"world", "llo wor" finds "hello world").
+"""
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app_settings_loader import ROOT_DIR, get_setting
+from md_viewer.note_index import NoteFileIndex
+from md_viewer.support_functions import resolve_path
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into lower-cased word tokens."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class BaseSearchIndex(NoteFileIndex):
+    """Shared base of the search backends."""
+
+    THREAD_NAME = 'search-index'
+
+
+class SearchIndex(BaseSearchIndex):
+    """Inverted index (term -> {note id: positions}) over the .md files of a folder."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self._paths = []          # note id -> relative path ('' for removed notes)
+        self._free_ids = []       # ids of removed notes, reused for new ones
+        self._ids = {}            # relative path -> note id
+        self._stamps = {}         # note id -> (mtime_ns, size)
+        self._doc_terms = {}      # note id -> terms of the note, for removal
+        self._postings = {}       # term -> {note id: array of positions}
+        self._sorted_terms = None  # sorted list of terms for prefix lookups
+
+    # Building and updating
+
+    def build(self):
+        """Index every note in the folder (replaces any existing content)."""
+        with self._lock:
+            self._paths, self._free_ids, self._ids, self._stamps = [], [], {}, {}
+            self._doc_terms, self._postings, self._sorted_terms = {}, {}, None
+        for rel_path, st in self._iter_notes():
+            self._index_file(rel_path, st)
+        self._last_refresh = time.monotonic()
+        self._ready.set()
+
+    def _index_file(self, rel_path, st=None):
+        content, st = self._read_note(rel_path, st)
+        if content is None:
+            self.remove_note(rel_path)
+            return
+
+        positions = {}
+        for pos, term in enumerate(tokenize(content)):
+            positions.setdefault(term, array('I')).append(pos)
+
+        with self._lock:
+            doc_id = self._ids.get(rel_path)
+            if doc_id is not None:
+                self._drop_postings_locked(doc_id)
+            elif self._free_ids:
+                doc_id = self._free_ids.pop()
+            else:
+                doc_id = len(self._paths)
+                self._paths.append('')
+            self._paths[doc_id] = rel_path
+            self._ids[rel_path] = doc_id
+            self._stamps[doc_id] = (st.st_mtime_ns, st.st_size)
+            self._doc_terms[doc_id] = tuple(positions)
+            for term, term_positions in positions.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    self._postings[term] = {doc_id: term_positions}
+                    self._sorted_terms = None
+                else:
+                    postings[doc_id] = term_positions
+
+    def _remove_locked(self, rel_path):
+        doc_id = self._ids.pop(rel_path, None)
+        if doc_id is None:
+            return
+        self._drop_postings_locked(doc_id)
+        self._paths[doc_id] = ''
+        self._stamps.pop(doc_id, None)
+        self._free_ids.append(doc_id)
+
+    def _drop_postings_locked(self, doc_id):
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+
+    def update_note(self, rel_path):
+        """(Re-)index one note, path relative to the notes folder."""
+        rel_path = str(rel_path).replace(os.sep, '/')
+        if rel_path.endswith('.md'):
+            self._index_file(rel_path)
+
+    def remove_note(self, rel_path):
+        """Drop one note from the index."""
+        with self._lock:
+            self._remove_locked(str(rel_path).replace(os.sep, '/'))
+
+    def refresh(self):
+        """Re-index notes whose mtime/size changed on disk and drop deleted ones."""
+        seen = set()
+        for rel_path, st in self._iter_notes():
+            seen.add(rel_path)
+            with self._lock:
+                doc_id = self._ids.get(rel_path)
+                stamp = self._stamps.get(doc_id) if doc_id is not None else None
+            if stamp != (st.st_mtime_ns, st.st_size):
+                self._index_file(rel_path, st)
+        with self._lock:
+            for rel_path in [p for p in self._ids if p not in seen]:
+                self._remove_locked(rel_path)
+        self._last_refresh = time.monotonic()
+
+    # Querying
+
+    def _prefix_postings(self, prefix):
+        """Merge the postings of every term starting with prefix."""
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        merged = {}
+        i = bisect_left(self._sorted_terms, prefix)
+        while i < len(self._sorted_terms) and self._sorted_terms[i].startswith(prefix):
+            for doc_id, positions in self._postings[self._sorted_terms[i]].items():
+                merged.setdefault(doc_id, set()).update(positions)
+            i += 1
+        return merged
+
+    def _matching_postings(self, test):
+        """Merge the postings of every term for which test(term) is true (looks at all terms)."""
+        merged = {}
+        for term, postings in self._postings.items():
+            if test(term):
+                for doc_id, positions in postings.items():
+                    merged.setdefault(doc_id, set()).update(positions)
+        return merged
+
+    def _phrase_matches_locked(self, term_postings):
+        """[(relative path, number of matches)] of the notes where the terms follow each other."""
+        if not all(term_postings):
+            return []
+        # Start from the rarest term, then check the phrase positions
+        candidates = set(min(term_postings, key=len))
+        for postings in term_postings:
+            candidates.intersection_update(postings)
+        results = []
+        for doc_id in candidates:
+            starts = set(term_postings[0][doc_id])
+            for offset, postings in enumerate(term_postings[1:], start=1):
+                positions = postings[doc_id]
+                if not isinstance(positions, set):
+                    positions = set(positions)
+                starts = {p for p in starts if p + offset in positions}
+                if not starts:
+                    break
+            if starts:
+                results.append((self._paths[doc_id], len(starts)))
+        return results
+
+    def search(self, query):
+        """
+        Return [(relative path, number of phrase matches)] for notes containing
+        the query, best matches first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            term_postings = [self._postings.get(term, {}) for term in terms[:-1]]
+            term_postings.append(self._prefix_postings(terms[-1]))
+            results = self._phrase_matches_locked(term_postings)
+            if not results:
+                # Nothing starts like the query: match it inside words too,
+                # like a plain substring search ("orld" finds "world")
+                if len(terms) == 1:
+                    first = self._matching_postings(lambda term: terms[0] in term)
+                else:
+                    first = self._matching_postings(lambda term: term.endswith(terms[0]))
+                results = self._phrase_matches_locked([first] + term_postings[1:])
+        results.sort(key=lambda r: (-r[1], r[0].lower()))
+        return results
+
+
+class SqliteSearchIndex(BaseSearchIndex):
+    """
+    Search index stored in an SQLite FTS5 database file.
+
+    The file survives restarts: on startup only notes whose mtime/size differ
+    from the stored ones are re-indexed (a stat-only walk when nothing
+    changed). The index is used once that reconcile is done, so it never
+    returns notes deleted while the app was down or misses new ones. Several
+    worker processes can share one file (WAL mode). Results are ordered by BM25 with the title weighted
+    above the body.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, body, tokenize = 'unicode61', prefix = '2 3'
+        );
+    """
+
+    def __init__(self, root, db_path):
+        super().__init__(root)
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        """Return this thread's connection to the index file."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # Notes written per transaction while reconciling, so other workers
+    # sharing the file don't wait on one long write lock
+    REFRESH_BATCH = 200
+
+    def build(self):
+        """Reconcile the stored index with the notes folder."""
+        self.refresh()
+        self._ready.set()
+
+    @contextmanager
+    def _write_transaction(self):
+        """
+        Run a write transaction that takes the file's write lock up front
+        (BEGIN IMMEDIATE), so what is read inside it is current even if other
+        workers write to the same file.
+        """
+        conn = self._conn()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def _stored_stamp(self, conn, rel_path):
+        row = conn.execute('SELECT mtime_ns, size FROM notes WHERE path = ?', (rel_path,)).fetchone()
+        return tuple(row) if row else None
+
+    def _store_locked(self, conn, rel_path, content, st):
+        row = conn.execute('SELECT id FROM notes WHERE path = ?', (rel_path,)).fetchone()
+        if row:
+            note_id = row[0]
+            conn.execute('UPDATE notes SET mtime_ns = ?, size = ? WHERE id = ?',
+                         (st.st_mtime_ns, st.st_size, note_id))
+            conn.execute('DELETE FROM notes_fts WHERE rowid = ?', (note_id,))
+        else:
+            note_id = conn.execute('INSERT INTO notes (path, mtime_ns, size) VALUES (?, ?, ?)',
+                                   (rel_path, st.st_mtime_ns, st.st_size)).lastrowid
+        conn.execute('INSERT INTO notes_fts (rowid, title, body) VALUES (?, ?, ?)',
+                     (note_id, Path(rel_path).stem, content))
+
+    def _delete_locked(self, conn, rel_path):
+        row = conn.execute('SELECT id FROM notes WHERE path = ?', (rel_path,)).fetchone()
+        if row:
+            conn.execute('DELETE FROM notes_fts WHERE rowid = ?', (row[0],))
+            conn.execute('DELETE FROM notes WHERE id = ?', (row[0],))
+
+    def update_note(self, rel_path):
+        """(Re-)index one note, path relative to the notes folder."""
+        rel_path = str(rel_path).replace(os.sep, '/')
+        if not rel_path.endswith('.md'):
+            return
+        content, st = self._read_note(rel_path)
+        with self._write_transaction() as conn:
+            if content is None:
+                self._delete_locked(conn, rel_path)
+            else:
+                self._store_locked(conn, rel_path, content, st)
+
+    def remove_note(self, rel_path):
+        """Drop one note from the index."""
+        with self._write_transaction() as conn:
+            self._delete_locked(conn, str(rel_path).replace(os.sep, '/'))
+
+    def refresh(self):
+        """Re-index notes whose mtime/size changed on disk and drop deleted ones."""
+        stored = {path: (mtime_ns, size) for path, mtime_ns, size in
+                  self._conn().execute('SELECT path, mtime_ns, size FROM notes')}
+        changed = [(rel_path, st) for rel_path, st in self._iter_notes()
+                   if stored.pop(rel_path, None) != (st.st_mtime_ns, st.st_size)]
+        # The lists above may be stale by the time they are written (another
+        # worker reconciling the same file), so every note is checked again
+        # inside the write transaction
+        for start in range(0, len(changed), self.REFRESH_BATCH):
+            with self._write_transaction() as conn:
+                for rel_path, st in changed[start:start + self.REFRESH_BATCH]:
+                    if self._stored_stamp(conn, rel_path) == (st.st_mtime_ns, st.st_size):
+                        continue
+                    content, st = self._read_note(rel_path, st)
+                    if content is None:
+                        self._delete_locked(conn, rel_path)
+                    else:
+                        self._store_locked(conn, rel_path, content, st)
+        # Whatever is left in stored no longer exists on disk
+        if stored:
+            with self._write_transaction() as conn:
+                for rel_path in stored:
+                    if not os.path.isfile(os.path.join(self.root, rel_path)):
+                        self._delete_locked(conn, rel_path)
+        self._last_refresh = time.monotonic()
+
+    def search(self, query):
+        """
+        Return [(relative path, BM25 score)] for notes containing the query as a
+        phrase (last word as prefix), best matches first, or else for notes
+        containing it as a substring.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = '"' + ' '.join(terms) + '" *'
+        try:
+            rows = self._conn().execute(
+                'SELECT notes.path, bm25(notes_fts, 10.0, 1.0) AS score '
+                'FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid '
+                'WHERE notes_fts MATCH ? ORDER BY score',
+                (match,)).fetchall()
+            if not rows:
+                # Nothing starts like the query: match it as a substring of
+                # the stored text like the plain vault scan did ("orld" finds "world")
+                pattern = '%' + re.sub(r'([\\%_])', r'\\\1', query) + '%'
+                rows = self._conn().execute(
+                    "SELECT notes.path, 0 FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+                    "WHERE notes_fts.body LIKE ? ESCAPE '\\' ORDER BY notes.path",
+                    (pattern,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error searching index: {str(e)}")
+            return []
+        # bm25() is lower for better matches
+        return [(path, -score) for path, score in rows]
+
+
+def snippet_for(full_path, query, width=50):
+    """Return the text around the first match of query in the note (or its start)."""
+    try:
+        with open(full_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError):
+        return ''
+    terms = tokenize(query)
+    pattern = r'\W+'.join(re.escape(t) for t in terms) if terms else re.escape(query.lower())
+    match = re.search(pattern, content.lower())
+    pos, length = (match.start(), match.end() - match.start()) if match else (0, 0)
+    start = max(0, pos - width)
+    end = min(len(content), pos + length + width)
+    return content[start:end].strip()
+
+
+_search_index = None
+
+
+def init_search_index(root):
+    """
+    Create the process-wide index for root using the configured SEARCH_BACKEND
+    ('memory' or 'sqlite') and start building it.
+    """
+    global _search_index
+    backend = get_setting('MD_NOTES_APP', 'SEARCH_BACKEND', fallback='memory').strip().lower()
+    _search_index = None
+    if backend == 'sqlite':
+        db_path = get_setting('MD_NOTES_APP', 'SEARCH_INDEX_FILE', fallback='search_index.sqlite3')
+        try:
+            _search_index = SqliteSearchIndex(Path(root), resolve_path(db_path, ROOT_DIR))
+        except sqlite3.Error as e:
+            # e.g. SQLite built without FTS5 - keep search working in memory
+            print(f"Error opening search index {db_path}, using in-memory index: {str(e)}")
+    if _search_index is None:
+        _search_index = SearchIndex(Path(root))
+    _search_index.build_in_background()
+    return _search_index
+
+
+def get_search_index():
+    """Return the process-wide index if it is built, otherwise None."""
+    if _search_index is not None and _search_index.ready:
+        return _search_index
+    return None
+
+
+def update_note(rel_path):
+    """Re-index a note after it was created, edited or uploaded."""
+    if _search_index is not None:
+        _search_index.update_note(rel_path)
+
+
+def remove_note(rel_path):
+    """Drop a deleted note from the index."""
+    if _search_index is not None:
+        _search_index.remove_note(rel_path)
@@ -1,15 +1,17 @@
 from flask import render_template, request, url_for, jsonify, current_app
 from pathlib import Path
 import os
-from app_settings_loader import get_setting, set_setting
-from md_viewer.support_functions import build_tree_structure, check_notes_dir_security, NOTES_FOLDER
+from app_settings_loader import get_setting, set_setting, set_settings
+from md_viewer.support_functions import get_notes_tree, check_notes_dir_security, NOTES_FOLDER
+from md_viewer.render_cache import rendered_notes
+from md_viewer.warmup import warmup_status
 from md_viewer import md_viewer_bp
 
 
 @md_viewer_bp.route('/settings')
 def image_storage_settings_page():
     """Show image storage settings page"""
-    notes_tree = build_tree_structure(NOTES_FOLDER)
+    notes_tree = get_notes_tree()
     
     return render_template('settings.html',
                          notes_tree=notes_tree,
@@ -48,10 +50,10 @@ def image_storage_settings():
                 'IMAGE_SUBFOLDER_NAME': subfolder if mode == '4' else 'attatched'
             }
 
-            # Update settings.ini and app config
-            for key, value in settings.items():
-                set_setting('MD_NOTES_APP', key, value)
-                current_app.config[key] = value
+            # Update settings.ini in one write, then the app config
+            if not set_settings('MD_NOTES_APP', settings):
+                return jsonify({'error': 'Failed to save settings'}), 500
+            current_app.config.update(settings)
 
             return jsonify({
                 'success': True,
@@ -223,10 +225,10 @@ def app_settings():
                 'ALLOWED_FILE_EXTENSIONS': allowed_file_extensions
             }
 
-            # Update each setting
-            for key, value in settings.items():
-                set_setting('MD_NOTES_APP', key, value)
-                current_app.config[key] = value
+            # Update all settings in one write, then the app config
+            if not set_settings('MD_NOTES_APP', settings):
+                return jsonify({'error': 'Failed to save settings'}), 500
+            current_app.config.update(settings)
 
             return jsonify({
                 'success': True,
@@ -255,3 +257,7 @@ def app_settings():
         current_app.logger.error(f"Error reading application settings: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@md_viewer_bp.route('/settings/render_cache')
+def render_cache_stats():
+    """Return hit/miss counters and size of the rendered note cache, and the pre-render progress"""
+    return jsonify(dict(rendered_notes.stats(), warmup=warmup_status))
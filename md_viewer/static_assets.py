@@ -0,0 +1,99 @@
+"""
+Self-hosted, fingerprinted highlight.js bundle.
+
+With HIGHLIGHT_SOURCE = local, build_highlight_bundle() concatenates
+highlight.min.js and the language files the app uses (from
+md_viewer/static/highlight) into one script, names it and the stylesheet
+after a hash of their content and writes them to md_viewer/static/dist. The
+files are served by /assets/<name> with a one-year immutable Cache-Control,
+since a changed file always gets a new name; gzip (and brotli, if installed)
+variants are written next to them and served as is. With HIGHLIGHT_SOURCE = cdn
+(the default) pages keep loading highlight.js from the public CDN.
+"""
+import gzip
+import hashlib
+import os
+
+from app_settings_loader import get_setting
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+HIGHLIGHT_DIR = os.path.join(STATIC_DIR, 'highlight')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+ASSET_MAX_AGE = 365 * 24 * 3600  # seconds
+# Precompressed variants written next to every bundle
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Languages registered on top of the ones built into highlight.min.js
+HIGHLIGHT_LANGUAGES = [
+    'python', 'javascript', 'typescript', 'bash', 'shell', 'powershell', 'json', 'yaml',
+    'markdown', 'css', 'sql', 'xml', 'ini', 'dockerfile',
+]
+HIGHLIGHT_STYLE = 'github-dark'
+
+# {'js': file name, 'css': file name} of the current bundle, None when using the CDN
+highlight_bundle = None
+
+
+def _write_fingerprinted(stem, suffix, content):
+    """
+    Write content (and its .gz / .br variants) to DIST_DIR as
+    <stem>.<hash><suffix> unless it exists, return the name.
+    """
+    name = f"{stem}.{hashlib.sha256(content).hexdigest()[:16]}{suffix}"
+    path = os.path.join(DIST_DIR, name)
+    variants = {
+        path: lambda: content,
+        path + ENCODING_SUFFIXES['gzip']: lambda: gzip.compress(content, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        variants[path + ENCODING_SUFFIXES['br']] = lambda: brotli.compress(content, quality=11)
+    for variant_path, make_data in variants.items():
+        if not os.path.exists(variant_path):
+            tmp_path = f"{variant_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(make_data())
+            os.replace(tmp_path, variant_path)
+    # Drop bundles of earlier versions
+    for old in os.listdir(DIST_DIR):
+        if old.startswith(stem + '.') and not old.startswith(name):
+            try:
+                os.remove(os.path.join(DIST_DIR, old))
+            except OSError:
+                pass
+    return name
+
+
+def build_highlight_bundle():
+    """
+    Build the highlight.js bundle if HIGHLIGHT_SOURCE is 'local' and remember
+    it for the templates. Falls back to the CDN if the files can't be read or
+    written.
+    """
+    global highlight_bundle
+    if get_setting('MD_NOTES_APP', 'HIGHLIGHT_SOURCE', fallback='cdn').strip().lower() != 'local':
+        highlight_bundle = None
+        return None
+    try:
+        parts = []
+        for path in [os.path.join(HIGHLIGHT_DIR, 'highlight.min.js')] + [
+                os.path.join(HIGHLIGHT_DIR, 'languages', f'{lang}.min.js') for lang in HIGHLIGHT_LANGUAGES]:
+            with open(path, 'rb') as f:
+                parts.append(f.read().strip())
+        with open(os.path.join(HIGHLIGHT_DIR, 'styles', f'{HIGHLIGHT_STYLE}.min.css'), 'rb') as f:
+            css = f.read()
+
+        os.makedirs(DIST_DIR, exist_ok=True)
+        highlight_bundle = {
+            # The language files end without a semicolon, keep them separate statements
+            'js': _write_fingerprinted('highlight.bundle', '.min.js', b';\n'.join(parts) + b';\n'),
+            'css': _write_fingerprinted(HIGHLIGHT_STYLE, '.min.css', css),
+        }
+    except OSError as e:
+        print(f"Error building highlight.js bundle, using the CDN: {str(e)}")
+        highlight_bundle = None
+    return highlight_bundle
@@ -1,11 +1,24 @@
-from flask import url_for, jsonify, current_app
+from flask import url_for, jsonify, current_app, request, render_template, session
+from abc import ABC, abstractmethod
+import filecmp
+import hashlib
+import html
+import json
 import os
 import mistune
 from pathlib import Path
+import queue
 import re
-from app_settings_loader import ROOT_DIR, get_setting
+import threading
+import time
+from typing import NamedTuple
+from collections import deque
+from app_settings_loader import ROOT_DIR, get_setting, settings_version
+from md_viewer import static_assets
 from datetime import datetime
 import magic  # For file type detection
+from markupsafe import Markup, escape
+from werkzeug.http import is_resource_modified
 
 
 def resolve_path(path: str, base_dir: str) -> str:
@@ -28,36 +41,253 @@ ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 def allowed_image_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
+# mistune 3 calls image(text, url, title), mistune 2 called image(src, alt, title)
+MISTUNE_V2 = int(mistune.__version__.split('.')[0]) < 3
+# Precompiled patterns used for every image of every note
+OBSIDIAN_EMBED_RE = re.compile(r'^!\[\[(.*)\]\]$')
+IMAGE_FILE_RE = re.compile(r'(?:.*/)?([\w\- .]+\.(?:png|jpg|jpeg|gif|webp))', re.IGNORECASE)
+# [[Note]], [[folder/Note#Heading|alias]] - but not ![[embeds]]
+WIKILINK_PATTERN = (r'(?<!!)\[\[(?P<wikilink_target>[^\[\]|#\n]*)'
+                    r'(?:#(?P<wikilink_heading>[^\[\]|\n]*))?'
+                    r'(?:\|(?P<wikilink_alias>[^\[\]\n]*))?\]\]')
+
+
+def parse_wikilink(inline, m, state):
+    """mistune 3 inline rule: turn [[...]] into a wikilink token."""
+    target = m.group('wikilink_target').strip()
+    heading = (m.group('wikilink_heading') or '').strip()
+    alias = (m.group('wikilink_alias') or '').strip()
+    if state.in_link or not (target or heading):
+        inline.process_text(m.group(0), state)
+        return m.end()
+    if alias:
+        text = alias
+    elif target and heading:
+        text = f'{target} > {heading}'
+    else:
+        text = target or heading
+    state.append_token({'type': 'wikilink', 'raw': text, 'attrs': {'target': target, 'heading': heading}})
+    return m.end()
+
+
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+SLUG_STRIP_RE = re.compile(r'[^\w\s-]')
+
+
+def heading_slug(text):
+    """
+    Anchor id of a heading: lower-cased words joined by '-'. Used for the ids
+    of rendered headings and for [[Note#Heading]] links, so both agree.
+    """
+    text = html.unescape(HTML_TAG_RE.sub('', text)).strip().lower()
+    return re.sub(r'\s+', '-', SLUG_STRIP_RE.sub('', text)).strip('-')
+
+
+def wikilink_plugin(md):
+    """Render Obsidian [[wikilinks]] through ObsidianRenderer.wikilink."""
+    md.inline.register('wikilink', WIKILINK_PATTERN, parse_wikilink, before='link')
+
+
+# ![[image.png]], ![[image.png|300]], ![[image.png|300x200]], ![[file.pdf]], ![[Note]]
+EMBED_PATTERN = (r'!\[\[(?P<embed_target>[^\[\]|#\n]+)(?:#[^\[\]|\n]*)?'
+                 r'(?:\|(?P<embed_option>[^\[\]\n]*))?\]\]')
+EMBED_SIZE_RE = re.compile(r'^(\d+)(?:x(\d+))?$')
+
+
+def parse_embed(inline, m, state):
+    """mistune 3 inline rule: turn ![[...]] into an embed token."""
+    target = m.group('embed_target').strip()
+    option = (m.group('embed_option') or '').strip()
+    state.append_token({'type': 'embed', 'raw': target, 'attrs': {'option': option}})
+    return m.end()
+
+
+def embed_plugin(md):
+    """Render Obsidian ![[embeds]] through ObsidianRenderer.embed."""
+    md.inline.register('embed', EMBED_PATTERN, parse_embed, before='link')
+
 # Custom markdown renderer to handle Obsidian image syntax
 class ObsidianRenderer(mistune.HTMLRenderer):
-    def image(self, src, alt="", title=None):
+    def __init__(self, note_path=None, **kwargs):
+        """note_path: the note being rendered (relative to NOTES_DIR), images are resolved against it"""
+        super().__init__(**kwargs)
+        self.begin_render(note_path)
+
+    def begin_render(self, note_path=None):
+        """
+        Prepare the renderer for one note: remember its path and resolve the
+        image settings once, instead of once per image.
+        """
+        self.note_path = note_path
+        self.heading_ids = set()  # ids given to the note's headings so far
+        # Link target -> path it resolved to in note_links / attachments, see LinkDependencies
+        self.resolved_notes = {}
+        self.resolved_attachments = {}
+        self.storage_mode = get_setting('MD_NOTES_APP', 'IMAGE_STORAGE_MODE')
+        # A note in a skipped directory can't show images; raise on the first one like before
+        self.storage_error = None
+        try:
+            get_image_storage_info(note_path)
+        except ValueError as e:
+            self.storage_error = e
+
+    def image(self, text, url=None, title=None):
+        if MISTUNE_V2:
+            src, alt = text, url or ''
+        else:
+            src, alt = url, text
         # Handle Obsidian-style ![[...]] or relative paths from any storage location
         # Strip any ![[...]] wrapper
-        stripped_src = re.sub(r'^!\[\[(.*)\]\]$', r'\1', src)
-        image_match = re.match(r'(?:.*/)?([\w\- .]+\.(?:png|jpg|jpeg|gif|webp))', stripped_src, re.IGNORECASE)
+        stripped_src = OBSIDIAN_EMBED_RE.sub(r'\1', src)
+        image_match = IMAGE_FILE_RE.match(stripped_src)
         if image_match:
-            # Get storage info based on current note path
-            note_path = getattr(current_app, 'current_note_path', None)
-            storage_dir, storage_base = get_image_storage_info(note_path)
-            storage_mode = get_setting('MD_NOTES_APP', 'IMAGE_STORAGE_MODE')
-            
-            # Clean up the path and normalize slashes
-            clean_path = os.path.normpath(stripped_src).replace('\\', '/').strip('/')
-            
-            # Use appropriate endpoint based on storage mode
-            if storage_mode == '2':
-                # Mode 2: Specific storage folder - just the filename
-                image_url = url_for('md_viewer.serve_stored_image', filename=os.path.basename(clean_path))
-            else:
-                # For modes 1, 3, and 4 - use path as provided in markdown
-                # The paths in markdown should already be correct based on the mode:
-                # Mode 1: just filename.png
-                # Mode 3: filename.png (same directory as note)
-                # Mode 4: subfolder/filename.png
-                image_url = url_for('md_viewer.serve_attatched_image', image_path=clean_path)
+            if self.storage_error is not None:
+                raise self.storage_error
             
+            image_url = self.image_url(stripped_src)
             return f'<img src="{image_url}" alt="{alt}" title="{title or alt}">'
-        return super().image(src, alt, title)
+        if MISTUNE_V2:
+            return super().image(src, alt, title)
+        return super().image(alt, src, title)
+
+    def resolve_note(self, target):
+        """note_links.resolve() for this note, remembering the result."""
+        path = self.resolved_notes[target] = note_links.resolve(target, self.note_path)
+        return path
+
+    def resolve_attachment(self, target):
+        """attachments.resolve() for this note, remembering the result."""
+        path = self.resolved_attachments[target] = attachments.resolve(target, self.note_path)
+        return path
+
+    def image_url(self, src):
+        """
+        URL of an image linked from the note. The image is looked up by name in
+        the attachment index like Obsidian does; images that are not in the
+        vault are served from where the storage mode puts them.
+        """
+        # Clean up the path and normalize slashes
+        clean_path = os.path.normpath(src).replace('\\', '/').strip('/')
+        found = self.resolve_attachment(clean_path)
+        if found is not None:
+            return url_for('md_viewer.serve_attatched_image', image_path=found)
+        if self.storage_mode == '2':
+            # Mode 2: Specific storage folder - just the filename
+            return url_for('md_viewer.serve_stored_image', filename=os.path.basename(clean_path))
+        return url_for('md_viewer.serve_attatched_image', image_path=clean_path)
+
+    def embed(self, target, option=''):
+        extension = os.path.splitext(target)[1].lower().lstrip('.')
+        if extension in ALLOWED_IMAGE_EXTENSIONS:
+            if self.storage_error is not None:
+                raise self.storage_error
+            # The option is a size (300 or 300x200) or the alt text
+            size = EMBED_SIZE_RE.match(option)
+            alt = escape(os.path.basename(target) if size or not option else option)
+            attrs = f' width="{size.group(1)}"' if size else ''
+            if size and size.group(2):
+                attrs += f' height="{size.group(2)}"'
+            return f'<img src="{self.image_url(target)}" alt="{alt}" title="{alt}"{attrs}>'
+        if not extension or extension == 'md':
+            # Notes are linked, not transcluded
+            return self.wikilink(option or target, target)
+        text = escape(option or os.path.basename(target))
+        found = self.resolve_attachment(target)
+        if found is None:
+            return f'<span class="wikilink wikilink-unresolved" title="File not found">{text}</span>'
+        return f'<a class="wikilink" href="{url_for("md_viewer.view_file", file_path=found)}">{text}</a>'
+
+    def heading(self, text, level, **attrs):
+        # Headings get ids for [[Note#Heading]] links; repeated headings get
+        # -1, -2... and links go to the first one, like in Obsidian
+        slug = heading_slug(text) or 'section'
+        heading_id, counter = slug, 1
+        while heading_id in self.heading_ids:
+            heading_id = f'{slug}-{counter}'
+            counter += 1
+        self.heading_ids.add(heading_id)
+        return f'<h{level} id="{escape(heading_id)}">{text}</h{level}>\n'
+
+    def wikilink(self, text, target='', heading=''):
+        href = ''
+        # [[#Heading]] links within the note itself
+        if target or not heading:
+            path = self.resolve_note(target) if target else self.note_path
+            if path is None:
+                return f'<span class="wikilink wikilink-unresolved" title="Note not found">{escape(text)}</span>'
+            href = url_for("md_viewer.note", note_path=path)
+        if heading:
+            # [[Note#Heading#Subheading]] links to the last heading
+            href += '#' + heading_slug(heading.split('#')[-1])
+        return f'<a class="wikilink" href="{escape(href)}">{escape(text)}</a>'
+
+
+class MarkdownRenderEngine:
+    """
+    A mistune parser and ObsidianRenderer pair that is reused for many notes.
+    Not thread-safe - use render_markdown(), which keeps one engine per thread.
+    """
+
+    def __init__(self):
+        self.renderer = ObsidianRenderer()
+        # The wikilink and embed plugins use the mistune 3 plugin API, with
+        # mistune 2 [[links]] stay plain text and ![[embeds]] are left to JS
+        plugins = [] if MISTUNE_V2 else [wikilink_plugin, embed_plugin]
+        self.markdown = mistune.Markdown(renderer=self.renderer, plugins=plugins)
+
+    def render(self, content, note_path=None):
+        """Render Markdown content of the note at note_path to HTML."""
+        self.renderer.begin_render(note_path)
+        return self.markdown(content)
+
+
+_render_engines = threading.local()
+
+def render_markdown(content, note_path=None):
+    """Render a note with this thread's MarkdownRenderEngine."""
+    return render_markdown_with_links(content, note_path)[0]
+
+
+class LinkDependencies(NamedTuple):
+    """
+    How a rendered note's links and embeds were resolved: sorted (target,
+    path) pairs from note_links and attachments, and the index versions they
+    were last checked at. The HTML is still valid after files were added or
+    removed as long as every target resolves to the same path. The pairs are
+    the same in every process, so they can go into the page's ETag.
+    """
+    note_path: str
+    note_targets: tuple
+    attachment_targets: tuple
+    notes_version: int
+    attachments_version: int
+
+    def current(self):
+        """
+        Return the dependencies updated to the current index versions if the
+        rendered links are unchanged, or None if the note must be rendered again.
+        """
+        notes_version, attachments_version = note_links.version, attachments.version
+        if (self.notes_version, self.attachments_version) == (notes_version, attachments_version):
+            return self
+        for targets, index in ((self.note_targets, note_links), (self.attachment_targets, attachments)):
+            if any(index.resolve(target, self.note_path) != path for target, path in targets):
+                return None
+        return self._replace(notes_version=notes_version, attachments_version=attachments_version)
+
+
+def render_markdown_with_links(content, note_path=None):
+    """Render a note, return (html, LinkDependencies)."""
+    engine = getattr(_render_engines, 'engine', None)
+    if engine is None:
+        engine = _render_engines.engine = MarkdownRenderEngine()
+    # Versions from before the render, so a file added meanwhile is checked again
+    notes_version, attachments_version = note_links.version, attachments.version
+    html = engine.render(content, note_path)
+    renderer = engine.renderer
+    return html, LinkDependencies(note_path, tuple(sorted(renderer.resolved_notes.items())),
+                                  tuple(sorted(renderer.resolved_attachments.items())),
+                                  notes_version, attachments_version)
 
 
 # Helper functions
@@ -120,11 +350,95 @@ def get_image_storage_info(note_path=None):
     # Default to mode 1 if invalid mode or missing note_path
     return notes_dir, None
 
-def build_tree_structure(directory, base_path=None, level=0):
-    """Build a tree structure from the directory, excluding hidden folders and those in NOTES_DIR_SKIP/HIDE_SIDEPANE."""
+class VaultEntry(NamedTuple):
+    """One classified directory entry returned by scan_directory()."""
+    name: str
+    path: str        # relative to the base path, '/'-separated
+    is_dir: bool
+    stem: str
+    suffix: str
+    file_type: str | None  # 'dir', 'md', 'images', 'text' or None if not allowed
+
+def scan_directory(directory, base_path=None, allowed_types=None):
+    """
+    List a single directory with os.scandir and classify every entry once.
+
+    Hidden entries are skipped. The result is sorted folders first, then by
+    lower-cased name. Type information comes from the DirEntry (no extra stat
+    on most filesystems) and file types are looked up in one extension map per
+    call, so listing an entry costs about one syscall. Raises OSError if the
+    directory cannot be read.
+    """
     if base_path is None:
         base_path = directory
+    rel_dir = os.path.relpath(directory, base_path)
+    rel_dir = '' if rel_dir == '.' else rel_dir.replace(os.sep, '/') + '/'
+    if allowed_types is None:
+        allowed_types = get_allowed_file_types()
+    type_by_ext = {ext.lower(): type_name
+                   for type_name, extensions in allowed_types.items() for ext in extensions}
+
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            name = entry.name
+            if name.startswith('.'):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            # Same split as Path.stem / Path.suffix
+            stem, dot, ext = name.rpartition('.')
+            if dot and stem and ext:
+                suffix = '.' + ext
+            else:
+                stem, suffix = name, ''
+            if is_dir:
+                file_type = 'dir'
+            elif suffix == '.md':
+                file_type = 'md'
+            else:
+                file_type = type_by_ext.get(suffix.lower())
+            entries.append(VaultEntry(name, rel_dir + name, is_dir, stem, suffix, file_type))
+    entries.sort(key=lambda e: (not e.is_dir, e.name.lower()))
+    return entries
+
+def _skip_dir_names():
+    skip_dirs = get_setting('MD_NOTES_APP', 'NOTES_DIR_SKIP', '').strip().split(',')
+    return {d.strip() for d in skip_dirs if d.strip()}
+
+def is_skipped_vault_path(rel_path):
+    """True if a path relative to the vault is hidden or inside a NOTES_DIR_SKIP folder."""
+    skip_dirs = _skip_dir_names()
+    return any(part.startswith('.') or part in skip_dirs
+               for part in Path(rel_path).parts)
+
+def iter_vault_files(root, accept):
+    """
+    Yield (relative path, stat) of every file under root whose name passes
+    accept(name), skipping hidden files and hidden and NOTES_DIR_SKIP folders.
+    """
+    skip_dirs = _skip_dir_names()
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in skip_dirs]
+        for name in files:
+            if name.startswith('.') or not accept(name):
+                continue
+            full_path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            yield os.path.relpath(full_path, root).replace(os.sep, '/'), st
+
+def iter_vault_notes(root):
+    """Yield (relative path, stat) of every .md file under root, skipping hidden and NOTES_DIR_SKIP folders."""
+    return iter_vault_files(root, lambda name: name.endswith('.md'))
+
 
+def _tree_filter_dirs():
+    """Return (skip_dirs, hide_dirs) used to filter the side panel tree."""
     # Get folders to skip or hide from settings
     skip_dirs = get_setting('MD_NOTES_APP', 'NOTES_DIR_SKIP', '').strip().split(',')
     skip_dirs = [d.strip() for d in skip_dirs if d.strip()]
@@ -136,31 +450,31 @@ def build_tree_structure(directory, base_path=None, level=0):
     subfolder_name = get_setting('MD_NOTES_APP', 'IMAGE_SUBFOLDER_NAME', fallback='attatched')
     if subfolder_name and subfolder_name not in hide_dirs:
         hide_dirs.append(subfolder_name)
+    return skip_dirs, hide_dirs
 
+def _list_tree_level(directory, base_path, level, skip_dirs, hide_dirs):
+    """
+    List one directory for the side panel tree. Folder nodes are returned
+    without 'children'; the caller fills them in.
+    """
     tree = []
     try:
-        for item in sorted(as_path(directory).iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-            # Skip hidden files, completely skip directories, and side panel hidden directories
-            if (item.name.startswith('.') or 
-                (item.is_dir() and item.name in skip_dirs) or 
-                (item.is_dir() and item.name in hide_dirs)):
+        for item in scan_directory(directory, base_path):
+            # Completely skip directories, and side panel hidden directories
+            if item.is_dir and (item.name in skip_dirs or item.name in hide_dirs):
                 continue
+            if not item.is_dir and item.file_type != 'md':
+                continue  # Skip non-markdown files, only include .md files
                 
-            rel_path = str(item.relative_to(base_path))
             node = {
                 'name': item.name,
-                'type': 'dir' if item.is_dir() else 'file',
-                'path': rel_path,
+                'type': 'dir' if item.is_dir else 'file',
+                'path': item.path,
                 'level': level,
                 'expanded': False  # Default to collapsed
             }
-            
-            if item.is_dir():
-                node['children'] = build_tree_structure(item, base_path, level + 1)
-            elif item.suffix == '.md':  # Only include .md files
+            if not item.is_dir:
                 node['display_name'] = item.stem  # Just use filename without extension
-            else:
-                continue  # Skip non-markdown files
                 
             tree.append(node)
     except Exception as e:
@@ -168,6 +482,315 @@ def build_tree_structure(directory, base_path=None, level=0):
         
     return tree
 
+def build_tree_structure(directory, base_path=None, level=0):
+    """Build a tree structure from the directory, excluding hidden folders and those in NOTES_DIR_SKIP/HIDE_SIDEPANE."""
+    if base_path is None:
+        base_path = directory
+
+    skip_dirs, hide_dirs = _tree_filter_dirs()
+    tree = _list_tree_level(directory, base_path, level, skip_dirs, hide_dirs)
+    for node in tree:
+        if node['type'] == 'dir':
+            node['children'] = build_tree_structure(as_path(directory) / node['name'], base_path, level + 1)
+    return tree
+
+
+class VaultTreeCache:
+    """
+    Cached side panel tree for the notes folder.
+
+    Every directory's listing is kept together with the directory mtime, so a
+    request only costs one stat per folder; a folder is listed again only when
+    its mtime changed or it was invalidated. Subtrees that did not change are
+    returned as the very same objects as before - treat the tree as read-only.
+    """
+
+    def __init__(self, root):
+        self.root = str(root)
+        self._dirs = {}  # abs dir path -> {'mtime', 'nodes', 'children', 'tree'}
+        self._filters = None
+        self._lock = threading.Lock()
+
+    def get_tree(self):
+        """Return the tree for the notes folder, relisting only changed folders."""
+        filters = _tree_filter_dirs()
+        with self._lock:
+            if filters != self._filters:
+                # NOTES_DIR_SKIP / NOTES_DIR_HIDE_SIDEPANE changed - start over
+                self._dirs.clear()
+                self._filters = filters
+            seen = set()
+            tree = self._get_subtree(self.root, 0, filters, seen)
+            if len(seen) != len(self._dirs):
+                # Drop folders that were deleted or are no longer shown
+                for key in self._dirs.keys() - seen:
+                    del self._dirs[key]
+            return tree
+
+    def _get_subtree(self, directory, level, filters, seen):
+        seen.add(directory)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []
+        entry = self._dirs.get(directory)
+        if entry is None or entry['mtime'] != mtime:
+            skip_dirs, hide_dirs = filters
+            entry = {
+                'mtime': mtime,
+                'nodes': _list_tree_level(directory, self.root, level, skip_dirs, hide_dirs),
+                'children': None,
+                'tree': None,
+            }
+            self._dirs[directory] = entry
+
+        children = [
+            self._get_subtree(os.path.join(directory, node['name']), level + 1, filters, seen)
+            for node in entry['nodes'] if node['type'] == 'dir'
+        ]
+        if entry['children'] is not None and all(
+                new is old for new, old in zip(children, entry['children'])):
+            return entry['tree']
+
+        # Something below changed - assemble this level again
+        tree = []
+        sub = iter(children)
+        for node in entry['nodes']:
+            if node['type'] == 'dir':
+                node = dict(node, children=next(sub))
+            tree.append(node)
+        entry['children'] = children
+        entry['tree'] = tree
+        return tree
+
+    def invalidate(self, path=None):
+        """
+        Forget cached listings for path (absolute or relative to the notes
+        folder) and all of its parent folders, or everything if path is None.
+        Used after the app changes files itself, so the next request does not
+        depend on directory mtime resolution.
+        """
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+                return
+            path = os.path.normpath(os.path.join(self.root, str(path)))
+            while True:
+                self._dirs.pop(path, None)
+                if path == self.root or not path.startswith(self.root + os.sep):
+                    break
+                path = os.path.dirname(path)
+
+
+_vault_tree_cache = VaultTreeCache(NOTES_FOLDER)
+
+def get_notes_tree():
+    """Return the (cached) side panel tree for NOTES_FOLDER."""
+    return _vault_tree_cache.get_tree()
+
+def get_notes_subtree(folder_path):
+    """
+    Return the children of one folder of the side panel tree, or None if the
+    folder is not part of the tree (missing, hidden or skipped).
+    """
+    nodes = get_notes_tree()
+    for part in [p for p in folder_path.split('/') if p]:
+        for node in nodes:
+            if node['type'] == 'dir' and node['name'] == part:
+                nodes = node['children']
+                break
+        else:
+            return None
+    return nodes
+
+def invalidate_notes_tree(path=None):
+    """Mark path (a file or folder in the vault) as changed, or everything if None."""
+    _vault_tree_cache.invalidate(path)
+
+
+class VaultNameIndex(ABC):
+    """
+    File name -> vault paths index used to resolve Obsidian links while
+    rendering without looking at the file system.
+
+    Follows Obsidian's "shortest path when possible" links: a link names a
+    file by its name or by the end of its path. A path relative to the linking
+    note's folder wins (so a file next to the note comes first), then an exact
+    vault path, then the match closest to the vault root. `version` changes
+    whenever files are added or removed, and changed_names() tells which names
+    were affected, so users of the index only redo the lookups of those names.
+    """
+    REFRESH_INTERVAL = 60  # seconds between checks for files added or removed outside the app
+    CHANGE_LOG_SIZE = 1000  # added/removed names remembered for changed_names()
+
+    def __init__(self, root):
+        self.root = str(root)
+        self._by_name = {}  # lower-cased name -> paths, closest to the root first
+        self._paths = set()
+        self._built = False
+        self._refreshing = False
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self.version = 0
+        self._changes = deque()  # (version, lower-cased name) of added/removed files
+        self._changes_known_since = 0  # changes after this version are all in _changes
+
+    @abstractmethod
+    def _accept(self, file_name):
+        """True if the index holds files with this name."""
+
+    def _name(self, path):
+        """Lower-cased lookup name of a vault path or link target."""
+        return path.rsplit('/', 1)[-1].lower()
+
+    def _clean_target(self, target):
+        """Normalize a link target to the form used in the index."""
+        return target.strip().replace('\\', '/').strip('/')
+
+    @staticmethod
+    def _order(path):
+        return path.count('/'), len(path), path.lower()
+
+    def lookup_name(self, target):
+        """Name a link target is looked up by, as reported by changed_names()."""
+        return self._name(self._clean_target(target))
+
+    def _record_changes_locked(self, names):
+        """Bump the version for files with these names added or removed."""
+        self.version += 1
+        if len(names) > self.CHANGE_LOG_SIZE:
+            self._changes.clear()
+            self._changes_known_since = self.version
+            return
+        for name in names:
+            if len(self._changes) >= self.CHANGE_LOG_SIZE:
+                self._changes_known_since = max(self._changes_known_since, self._changes.popleft()[0])
+            self._changes.append((self.version, name))
+
+    def changed_names(self, since_version):
+        """
+        Lookup names of the files added or removed after since_version, or None
+        if that is no longer known (too many changes since).
+        """
+        with self._lock:
+            if since_version == self.version:
+                return set()
+            if since_version < self._changes_known_since:
+                return None
+            return {name for version, name in self._changes if version > since_version}
+
+    def build(self):
+        """(Re)list the files of the vault."""
+        paths = {path for path, _ in iter_vault_files(self.root, self._accept)}
+        by_name = {}
+        for path in paths:
+            by_name.setdefault(self._name(path), []).append(path)
+        for candidates in by_name.values():
+            candidates.sort(key=self._order)
+        with self._lock:
+            if paths != self._paths:
+                if self._built:
+                    self._record_changes_locked({self._name(p) for p in paths ^ self._paths})
+                else:
+                    # Nothing to compare the first listing with
+                    self.version += 1
+                    self._changes.clear()
+                    self._changes_known_since = self.version
+            self._paths, self._by_name = paths, by_name
+            self._built = True
+            self._last_refresh = time.monotonic()
+
+    def refresh_if_stale(self):
+        """Run build() in the background if the last one is older than REFRESH_INTERVAL."""
+        with self._lock:
+            if (self._refreshing or not self._built or
+                    time.monotonic() - self._last_refresh < self.REFRESH_INTERVAL):
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.build()
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, name='vault-names-refresh', daemon=True).start()
+
+    def add(self, path):
+        """Add a created or uploaded file (path relative to the vault)."""
+        path = str(path).replace(os.sep, '/').strip('/')
+        if not self._accept(path.rsplit('/', 1)[-1]):
+            return
+        with self._lock:
+            if not self._built or path in self._paths:
+                return
+            self._paths.add(path)
+            candidates = self._by_name.setdefault(self._name(path), [])
+            candidates.append(path)
+            candidates.sort(key=self._order)
+            self._record_changes_locked({self._name(path)})
+
+    def remove(self, path):
+        """Remove a deleted file (path relative to the vault)."""
+        path = str(path).replace(os.sep, '/').strip('/')
+        with self._lock:
+            if path not in self._paths:
+                return
+            self._paths.discard(path)
+            name = self._name(path)
+            candidates = [p for p in self._by_name.get(name, []) if p != path]
+            if candidates:
+                self._by_name[name] = candidates
+            else:
+                self._by_name.pop(name, None)
+            self._record_changes_locked({name})
+
+    def resolve(self, target, from_note=None):
+        """Return the vault path the link target points to from from_note, or None."""
+        if not self._built:
+            self.build()
+        target = self._clean_target(target)
+        if not target:
+            return None
+        with self._lock:
+            matches = self._by_name.get(self._name(target), ())
+        if not matches:
+            return None
+        folder = from_note.rsplit('/', 1)[0] if from_note and '/' in from_note else ''
+        wanted = [f'{folder}/{target}'.lower()] if folder else []
+        wanted.append(target.lower())
+        for full in wanted:
+            for path in matches:
+                if path.lower() == full:
+                    return path
+        if '/' in target:
+            suffix = '/' + target.lower()
+            matches = [p for p in matches if p.lower().endswith(suffix)]
+        return matches[0] if matches else None
+
+
+class NoteLinkIndex(VaultNameIndex):
+    """Note name -> note paths, for [[wikilinks]]. Targets may omit the .md extension."""
+
+    def _accept(self, file_name):
+        return file_name.endswith('.md')
+
+    def _clean_target(self, target):
+        target = super()._clean_target(target)
+        if not target.lower().endswith('.md'):
+            target += '.md'
+        return target
+
+
+class AttachmentIndex(VaultNameIndex):
+    """Attachment name -> paths, for ![[image.png]] embeds and image links."""
+
+    def _accept(self, file_name):
+        return not file_name.endswith('.md')
+
+
+note_links = NoteLinkIndex(NOTES_FOLDER)
+attachments = AttachmentIndex(NOTES_FOLDER)
+
 def get_path_components(path):
     """Convert a file path into a list of directory names."""
     if not path:
@@ -200,6 +823,99 @@ def generate_breadcrumbs(note_path, title=None):
         
     return crumbs
 
+def wants_fragment():
+    """True if the client asked for the content only (X-Fragment: 1 header or ?fragment=1)."""
+    return request.headers.get('X-Fragment') == '1' or request.args.get('fragment') == '1'
+
+def render_fragment(template_name, **context):
+    """
+    Render only the title and content blocks of a page template and return
+    them as JSON with the breadcrumbs, for AJAX navigation. The side panel
+    and the rest of base.html are not rendered.
+    """
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    ctx = template.new_context(context)
+    response = jsonify({
+        'title': Markup(''.join(template.blocks['title'](ctx))).unescape().strip(),
+        'content': ''.join(template.blocks['content'](ctx)),
+        'breadcrumbs': context.get('breadcrumbs', []),
+    })
+    response.vary.add('X-Fragment')
+    return response
+
+def render_page(template_name, **context):
+    """render_template(), or just the content fragment if the client asked for it."""
+    if wants_fragment():
+        return render_fragment(template_name, **context)
+    response = current_app.make_response(render_template(template_name, **context))
+    response.vary.add('X-Fragment')
+    return response
+
+def _templates_stamp():
+    """Newest mtime of the page templates, so a deploy changes every page ETag."""
+    template_dir = os.path.join(os.path.dirname(__file__), 'templates')
+    try:
+        return max(entry.stat().st_mtime_ns for entry in os.scandir(template_dir))
+    except (OSError, ValueError):
+        return None
+
+TEMPLATES_STAMP = _templates_stamp()
+
+_last_tree_signature = (None, None)  # (tree, digest) of the last tree seen
+
+def notes_tree_signature(tree):
+    """Digest of a side panel tree, computed once per tree object (VaultTreeCache reuses them)."""
+    global _last_tree_signature
+    if tree is None:
+        return None
+    last_tree, digest = _last_tree_signature
+    if last_tree is not tree:
+        digest = hashlib.sha1(json.dumps(tree, sort_keys=True).encode('utf-8')).hexdigest()
+        _last_tree_signature = (tree, digest)
+    return digest
+
+def page_etag(*parts):
+    """
+    Strong ETag of a rendered page from everything it is rendered from: pass
+    the file identity and signatures of the data it shows. The settings
+    snapshot, the templates and asset bundles and full page vs. fragment are
+    added here.
+    """
+    key = (parts, settings_version(), TEMPLATES_STAMP, static_assets.highlight_bundle, wants_fragment())
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+CONTENT_CODINGS = ('gzip', 'br')
+
+def encoded_etag(etag, encoding):
+    """ETag of the compressed variant of a page - a strong ETag differs per content coding."""
+    return f'{etag}-{encoding}'
+
+def not_modified(etag, last_modified=None):
+    """
+    Return a 304 response if the client's copy is current: its If-None-Match
+    matches etag (or the ETag of a compressed variant), or (without
+    If-None-Match, and only if last_modified is given) its If-Modified-Since
+    is not older than last_modified. Returns None if the page has to be sent.
+    """
+    if session.get('_flashes'):
+        # Flashed messages have to be shown with the next full page
+        return None
+    for candidate in (etag,) + tuple(encoded_etag(etag, coding) for coding in CONTENT_CODINGS):
+        if not is_resource_modified(request.environ, etag=candidate, last_modified=last_modified):
+            response = set_validators(current_app.response_class(status=304), candidate, last_modified)
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+def set_validators(response, etag, last_modified=None):
+    """Add ETag / Last-Modified to a page and make caches revalidate it."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
 # Update app config from settings.ini
 def update_app_config():
     """Update app config from settings.ini"""
@@ -218,19 +934,17 @@ def get_all_folders(directory, base_path=None, level=0):
     
     folders = []
     try:
-        for item in sorted(as_path(directory).iterdir(), key=lambda x: x.name.lower()):
-            if item.name.startswith('.') or (item.is_dir() and item.name == 'attatched'):
+        for item in scan_directory(directory, base_path):
+            if not item.is_dir or item.name == 'attatched':
                 continue
             
-            if item.is_dir():
-                rel_path = str(item.relative_to(base_path))
-                folders.append({
-                    'name': item.name,
-                    'path': rel_path,
-                    'level': level
-                })
-                # Recursively get subfolders
-                folders.extend(get_all_folders(item, base_path, level + 1))
+            folders.append({
+                'name': item.name,
+                'path': item.path,
+                'level': level
+            })
+            # Recursively get subfolders
+            folders.extend(get_all_folders(os.path.join(directory, item.name), base_path, level + 1))
     except Exception as e:
         print(f"Error reading directory {directory}: {str(e)}")
     
@@ -270,6 +984,68 @@ def check_notes_dir_security(path):
     except Exception as e:
         return False, f'Invalid path: {str(e)}'
     
+def save_pasted_image(file, storage_dir):
+    """Save a pasted image as Pasted_image_<timestamp>, return its file name."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    suffix = Path(file.filename).suffix
+    filename = f'Pasted_image_{timestamp}{suffix}'
+    # Two pastes in the same second
+    counter = 1
+    while (storage_dir / filename).exists():
+        filename = f'Pasted_image_{timestamp}_{counter}{suffix}'
+        counter += 1
+    file.save(storage_dir / filename)
+    return filename
+
+PASTE_COPY_BUFFER_SIZE = 256 * 1024
+
+def save_pasted_image_deduplicated(file, storage_dir):
+    """
+    Save a pasted image under a name made from its content hash,
+    Pasted_image_<sha256[:16]>.<ext>, and return the file name. The hash is
+    computed while the upload is written to a temp file. If the same image is
+    already in storage_dir it is reused; if it is elsewhere in the vault
+    (other notes' folders in modes 3 and 4) it is hard-linked here, so the
+    link still follows IMAGE_STORAGE_MODE but the data is stored once.
+    """
+    suffix = Path(file.filename).suffix.lower()
+    digest = hashlib.sha256()
+    temp_path = storage_dir / f'temp_paste_{os.getpid()}_{threading.get_ident()}{suffix}'
+    try:
+        with open(temp_path, 'wb') as out:
+            while True:
+                data = file.stream.read(PASTE_COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+                out.write(data)
+        filename = f'Pasted_image_{digest.hexdigest()[:16]}{suffix}'
+        filepath = storage_dir / filename
+
+        # Names are only 64 bits of the hash - compare the content before reusing
+        if filepath.exists() and filecmp.cmp(temp_path, filepath, shallow=False):
+            return filename
+        if not filepath.exists():
+            existing = attachments.resolve(filename)
+            if existing is not None:
+                existing_path = Path(NOTES_FOLDER) / existing
+                if filecmp.cmp(temp_path, existing_path, shallow=False):
+                    try:
+                        os.link(existing_path, filepath)
+                        return filename
+                    except OSError:
+                        # Other file system, or no hard links - store a copy
+                        pass
+        else:
+            # A different image with the same name
+            filename = f'Pasted_image_{digest.hexdigest()}{suffix}'
+            filepath = storage_dir / filename
+        os.replace(temp_path, filepath)
+        return filename
+    finally:
+        if temp_path.exists():
+            os.remove(temp_path)
+
 def handle_uploaded_image(request_files, note_path=None):
     """Handle an image upload from the markdown editor."""
     if 'image' not in request_files:
@@ -283,16 +1059,20 @@ def handle_uploaded_image(request_files, note_path=None):
         return jsonify({'error': 'Invalid file type'}), 400
 
     # Get storage directory based on mode and note path
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'Pasted_image_{timestamp}{Path(file.filename).suffix}'
     storage_dir, storage_subfolder = get_image_storage_info(note_path)
     storage_mode = get_setting('MD_NOTES_APP', 'IMAGE_STORAGE_MODE')
 
     try:
         # Create storage directory if needed
         os.makedirs(storage_dir, exist_ok=True)
+        if get_setting('MD_NOTES_APP', 'PASTED_IMAGE_DEDUP', fallback=False, type_=bool):
+            filename = save_pasted_image_deduplicated(file, storage_dir)
+        else:
+            filename = save_pasted_image(file, storage_dir)
         filepath = storage_dir / filename
-        file.save(filepath)
+        relative_to_vault = os.path.relpath(filepath.resolve(), Path(NOTES_FOLDER).resolve())
+        if not relative_to_vault.startswith('..'):
+            attachments.add(relative_to_vault)
 
         # Construct the markdown link and relative path based on storage mode
         if storage_mode == '1':
@@ -390,13 +1170,59 @@ def get_language_from_extension(extension):
     }
     return language_map.get(extension, 'plaintext')
 
+# Bytes from the start of a file used to detect its type
+MAGIC_HEADER_BYTES = 64 * 1024
+
+# libmagic handles are shared by the whole app (loading the database is the
+# slow part). A handle must not be used by two threads at once, so there is a
+# pool of up to UPLOAD_WORKERS of them, created as needed and checked out per call
+_MIME_DETECTOR_POOL_SIZE = max(1, get_setting('MD_NOTES_APP', 'UPLOAD_WORKERS', fallback=4, type_=int))
+_mime_detectors = queue.Queue()
+_mime_detectors_created = 0
+_mime_detectors_lock = threading.Lock()
+
+def _checkout_mime_detector():
+    """Take a libmagic handle from the pool, creating one if the pool isn't full yet."""
+    global _mime_detectors_created
+    try:
+        return _mime_detectors.get_nowait()
+    except queue.Empty:
+        pass
+    with _mime_detectors_lock:
+        create = _mime_detectors_created < _MIME_DETECTOR_POOL_SIZE
+        if create:
+            _mime_detectors_created += 1
+    if not create:
+        return _mime_detectors.get()
+    try:
+        return magic.Magic(mime=True)
+    except Exception:
+        with _mime_detectors_lock:
+            _mime_detectors_created -= 1
+        raise
+
+def detect_mime_type(header):
+    """MIME type of a file from its first MAGIC_HEADER_BYTES bytes."""
+    detector = _checkout_mime_detector()
+    try:
+        return detector.from_buffer(bytes(header[:MAGIC_HEADER_BYTES]))
+    finally:
+        _mime_detectors.put(detector)
+
 def verify_file_type(file_path, claimed_extension):
     """
     Verify that the file's content matches its claimed extension.
     Returns tuple (is_valid, actual_type)
     """
-    mime = magic.Magic(mime=True)
-    file_type = mime.from_file(str(file_path))
+    with open(file_path, 'rb') as f:
+        return verify_file_header(f.read(MAGIC_HEADER_BYTES), claimed_extension)
+
+def verify_file_header(header, claimed_extension):
+    """
+    Verify that a file starting with header matches its claimed extension.
+    Returns tuple (is_valid, actual_type)
+    """
+    file_type = detect_mime_type(header)
     
     # Define allowed MIME types for each extension
     extension_mime_types = {
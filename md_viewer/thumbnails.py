@@ -0,0 +1,108 @@
+"""
+Thumbnails of vault images for folder listings.
+
+Thumbnails come in a few fixed sizes and are generated on first request into
+an on-disk cache (THUMBNAIL_CACHE_DIR). The cache file name contains the
+source's mtime and size, so an edited image gets a new thumbnail and the old
+one is removed. Generation runs on a small thread pool (THUMBNAIL_WORKERS),
+so opening a folder full of large screenshots queues the work instead of
+decoding every image at once; concurrent requests for the same thumbnail
+share one job.
+
+Needs Pillow. Without it the originals are served.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
+
+from app_settings_loader import ROOT_DIR, get_setting
+from md_viewer.support_functions import resolve_path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed - serve the originals
+    Image = None
+
+# Longest side in pixels of each thumbnail size
+THUMBNAIL_SIZES = {'sm': 96, 'md': 320, 'lg': 1280}
+# Formats Pillow can read; anything else (e.g. svg) is served as is
+THUMBNAIL_SOURCE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'}
+
+THUMBNAIL_CACHE_DIR = resolve_path(
+    get_setting('MD_NOTES_APP', 'THUMBNAIL_CACHE_DIR', fallback='thumbnail_cache'), ROOT_DIR)
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, get_setting('MD_NOTES_APP', 'THUMBNAIL_WORKERS', fallback=2, type_=int)),
+    thread_name_prefix='thumbnail')
+_pending = {}  # cache file name -> Future of the running job
+_pending_lock = threading.Lock()
+
+
+def can_thumbnail(file_path):
+    """True if a thumbnail can be made for this file."""
+    return Image is not None and os.path.splitext(file_path)[1].lower() in THUMBNAIL_SOURCE_EXTENSIONS
+
+
+def _cache_prefix(rel_path, size):
+    return f"{hashlib.sha1(rel_path.encode('utf-8')).hexdigest()}-{size}-"
+
+
+def _generate(source, target, prefix, max_side):
+    """Worker: write the thumbnail of source to target and drop older versions."""
+    with Image.open(source) as img:
+        # JPEGs are decoded at a reduced scale right away
+        img.draft('RGB', (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        try:
+            if target.endswith('.png'):
+                img.save(tmp_path, format='PNG', optimize=True)
+            else:
+                img.convert('RGB').save(tmp_path, format='JPEG', quality=80, optimize=True)
+            os.replace(tmp_path, target)
+        finally:
+            # Left over if saving failed (truncated image, disk full)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    # Thumbnails of earlier versions of the image
+    for name in os.listdir(THUMBNAIL_CACHE_DIR):
+        if name.startswith(prefix) and name != os.path.basename(target):
+            try:
+                os.remove(os.path.join(THUMBNAIL_CACHE_DIR, name))
+            except OSError:
+                pass
+    return target
+
+
+def get_thumbnail(source, rel_path, size):
+    """
+    Return the path of the cached `size` thumbnail of source (rel_path is its
+    path in the vault), generating it on the worker pool if needed. Returns
+    None if the image is already small enough to be served as is.
+    """
+    max_side = THUMBNAIL_SIZES[size]
+    st = os.stat(source)
+    prefix = _cache_prefix(rel_path, size)
+    name = f"{prefix}{st.st_mtime_ns}-{st.st_size}"
+    for target in (os.path.join(THUMBNAIL_CACHE_DIR, name + '.jpg'),
+                   os.path.join(THUMBNAIL_CACHE_DIR, name + '.png')):
+        if os.path.exists(target):
+            return target
+
+    with Image.open(source) as img:
+        # Only the header is read here
+        if max(img.size) <= max_side:
+            return None
+        has_alpha = img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+    target = os.path.join(THUMBNAIL_CACHE_DIR, name + ('.png' if has_alpha else '.jpg'))
+    with _pending_lock:
+        future = _pending.get(name)
+        if future is None:
+            os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+            future = _executor.submit(_generate, source, target, prefix, max_side)
+            _pending[name] = future
+            future.add_done_callback(lambda _, name=name: _pending.pop(name, None))
+    return future.result()
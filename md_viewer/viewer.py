@@ -1,14 +1,34 @@
-from flask import render_template, request, url_for, jsonify, send_from_directory, current_app, Response
+from flask import (
+    request, url_for, jsonify, send_from_directory, current_app, Response,
+    stream_with_context
+    )
 from werkzeug.utils import secure_filename
+from datetime import datetime, timezone
+from itertools import islice
+from urllib.parse import quote
+import json
+import mimetypes
 import os
-import mistune
 from pathlib import Path
 from app_settings_loader import get_setting
 from md_viewer.support_functions import (
-    build_tree_structure, get_path_components, generate_breadcrumbs, 
-    ObsidianRenderer, get_image_storage_info, as_path, NOTES_FOLDER,
-    get_allowed_file_types, get_file_type, verify_file_type,
+    get_notes_tree, get_path_components, generate_breadcrumbs, 
+    get_image_storage_info, NOTES_FOLDER,
+    get_allowed_file_types, get_file_type, verify_file_header, MAGIC_HEADER_BYTES,
+    invalidate_notes_tree, scan_directory, get_notes_subtree,
+    render_page, wants_fragment, render_markdown_with_links, note_links, attachments,
+    page_etag, not_modified, set_validators, notes_tree_signature, is_skipped_vault_path,
     )
+from md_viewer.search_index import get_search_index, snippet_for, update_note as update_search_index
+from md_viewer.link_graph import link_graph, update_note as update_link_graph
+from md_viewer.render_cache import rendered_notes, note_identity
+from md_viewer import static_assets
+from md_viewer.compression import cached_compressed_page, negotiate_encoding
+from md_viewer.thumbnails import THUMBNAIL_SIZES, can_thumbnail, get_thumbnail
+from md_viewer.zip_stream import iter_folder_zip
+from md_viewer import chunked_upload
+from md_viewer.chunked_upload import UploadError
+from md_viewer.batch_upload import save_batch
 from md_viewer import md_viewer_bp
 
 
@@ -16,8 +36,29 @@ NOTE_APP_NAME = get_setting('MD_NOTES_APP', 'NOTE_APP_NAME', fallback='Flask Blo
 
 @md_viewer_bp.context_processor
 def inject_app_name():
-    """Make app name available to all templates"""
-    return {'app_name': NOTE_APP_NAME}
+    """Make app name, side panel mode and the highlight.js bundle available to all templates"""
+    return {
+        'app_name': NOTE_APP_NAME,
+        'sidebar_lazy': get_setting('MD_NOTES_APP', 'SIDEBAR_LAZY_LOAD', fallback=False, type_=bool),
+        'highlight_bundle': static_assets.highlight_bundle,
+    }
+
+@md_viewer_bp.route('/assets/<path:filename>')
+def asset(filename):
+    """Serve a fingerprinted bundle from static/dist, cacheable forever since its name changes with its content"""
+    # Serve the precompressed variant written next to the bundle if the client takes it
+    encoding = negotiate_encoding()
+    suffix = static_assets.ENCODING_SUFFIXES.get(encoding)
+    if suffix and os.path.isfile(os.path.join(static_assets.DIST_DIR, filename + suffix)):
+        response = send_from_directory(static_assets.DIST_DIR, filename + suffix, max_age=static_assets.ASSET_MAX_AGE,
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(static_assets.DIST_DIR, filename, max_age=static_assets.ASSET_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @md_viewer_bp.route('/')
 def index():
@@ -34,46 +75,35 @@ def index():
         # Check if we should hide images
         images_hidden = get_setting('MD_NOTES_APP', 'IMAGES_FS_HIDE', fallback='False').lower() == 'true'
 
-        for item in sorted(as_path(NOTES_FOLDER).iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-            if item.name.startswith('.'):  # Skip hidden files
-                continue
-            
-            is_dir = item.is_dir()
-            rel_path = str(item.relative_to(NOTES_FOLDER))
-            
-            if is_dir:
+        for item in scan_directory(NOTES_FOLDER):
+            if item.is_dir:
                 folder_contents.append({
                     'name': item.name,
                     'type': 'dir',
-                    'path': rel_path,
+                    'path': item.path,
+                    'display_name': item.name
+                })
+            elif item.file_type == 'md':
+                # Always show markdown files
+                folder_contents.append({
+                    'name': item.name,
+                    'type': 'md',
+                    'path': item.path,
+                    'display_name': item.stem
+                })
+            elif item.file_type and (not images_hidden or item.file_type != 'images'):
+                # Show other supported files if not hidden
+                folder_contents.append({
+                    'name': item.name,
+                    'type': item.file_type,
+                    'path': item.path,
                     'display_name': item.name
                 })
-            else:
-                # Get file type
-                file_type = get_file_type(item.suffix)
-                
-                # Handle different file types
-                if item.suffix == '.md':
-                    # Always show markdown files
-                    folder_contents.append({
-                        'name': item.name,
-                        'type': 'md',
-                        'path': rel_path,
-                        'display_name': item.stem
-                    })
-                elif file_type and (not images_hidden or file_type != 'images'):
-                    # Show other supported files if not hidden
-                    folder_contents.append({
-                        'name': item.name,
-                        'type': file_type,
-                        'path': rel_path,
-                        'display_name': item.name
-                    })
     except Exception as e:
         print(f"Error reading root directory: {str(e)}")
 
-    notes_tree = build_tree_structure(NOTES_FOLDER)
-    return render_template('folder.html', 
+    notes_tree = None if wants_fragment() else get_notes_tree()
+    return render_page('folder.html', 
                          folder_path='',
                          folder_contents=folder_contents,
                          notes_tree=notes_tree, 
@@ -81,7 +111,10 @@ def index():
                          current_note=None,
                          breadcrumbs=generate_breadcrumbs(''),
                          allowed_image_extensions=allowed_image_extensions,
-                         allowed_file_extensions=allowed_file_extensions)
+                         allowed_file_extensions=allowed_file_extensions,
+                         upload_chunk_size=chunked_upload.upload_chunk_size(current_app.config['MAX_CONTENT_LENGTH']),
+                         max_request_size=current_app.config['MAX_CONTENT_LENGTH'],
+                         max_upload_size=chunked_upload.max_upload_size())
 
 @md_viewer_bp.route('/note/<path:note_path>')
 def note(note_path):
@@ -90,22 +123,53 @@ def note(note_path):
         return "Note not found", 404
 
     try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        note_links.refresh_if_stale()
+        attachments.refresh_if_stale()
+        link_graph.refresh_if_stale()
+        st = full_path.stat()
+
+        # Build tree (not needed for content-only requests) and linked mentions,
+        # once the link graph is built
+        notes_tree = None if wants_fragment() else get_notes_tree()
+        backlinks = link_graph.backlinks(note_path) if link_graph.ready else None
+
+        # The page only changes with the note, how its links and embeds
+        # resolve, its backlinks, the side panel and the settings - answer
+        # revalidations before the note is read or rendered
+        identity = note_identity(st)
+        tree_signature = notes_tree_signature(notes_tree)
+        def note_etag(links):
+            return page_etag(note_path, identity, links.note_targets, links.attachment_targets,
+                             backlinks, tree_signature)
+        last_modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+        # Links are known once the note was rendered and stay valid until a
+        # file added or removed changes where one of them points to
+        links = rendered_notes.links(note_path, identity)
+        html_content = None
+        if links is not None:
+            etag = note_etag(links)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
+            # The whole page compressed by an earlier request
+            cached = cached_compressed_page(('note', note_path, wants_fragment()), etag, last_modified)
+            if cached is not None:
+                return cached
+            html_content = rendered_notes.get(note_path, identity)
+
+        if html_content is None:
+            with open(full_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+
+            # Convert markdown to HTML with this thread's ObsidianRenderer, the
+            # note path is passed along for image processing
+            html_content, links = render_markdown_with_links(content, note_path)
+            rendered_notes.put(note_path, identity, html_content, links=links)
+            etag = note_etag(links)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
 
-        # Store current note path for image processing
-        current_app.current_note_path = note_path
-        
-        # Convert markdown to HTML using ObsidianRenderer
-        renderer = ObsidianRenderer()
-        markdown_parser = mistune.Markdown(renderer=renderer)
-        html_content = markdown_parser(content)
-        
-        # Clear the note path after rendering
-        current_app.current_note_path = None
-
-        # Build tree and get path components
-        notes_tree = build_tree_structure(NOTES_FOLDER)
         active_path = get_path_components(note_path)
         # Use file name (without .md) for breadcrumbs and title
         title = full_path.stem
@@ -114,9 +178,9 @@ def note(note_path):
         # Get storage info for this note
         storage_dir, storage_base = get_image_storage_info(note_path)
         
-        return render_template('note.html', 
-                            content=content,
+        response = render_page('note.html', 
                             html_content=html_content,
+                            backlinks=backlinks,
                             title=title,
                             notes_tree=notes_tree,
                             active_path=active_path,
@@ -124,16 +188,106 @@ def note(note_path):
                             breadcrumbs=breadcrumbs,
                             storage_mode=current_app.config['IMAGE_STORAGE_MODE'],
                             storage_base=storage_base)
+        return set_validators(response, etag, last_modified)
     except Exception as e:
         return f"Error reading note: {str(e)}", 500
     
+@md_viewer_bp.route('/tree/children')
+def tree_children():
+    """Return one folder's entries of the side panel tree (used when the tree is lazy loaded)"""
+    folder_path = request.args.get('path', '').strip('/')
+    children = get_notes_subtree(folder_path)
+    if children is None:
+        return jsonify({'error': 'Folder not found'}), 404
+
+    return jsonify({
+        'path': folder_path,
+        'children': [
+            {key: node[key] for key in ('name', 'type', 'path', 'level', 'display_name') if key in node}
+            for node in children
+        ]
+    })
+
+@md_viewer_bp.route('/graph')
+def note_graph():
+    """
+    Return the links between notes: the whole vault as an adjacency list
+    ({'nodes': [paths], 'links': [[node indexes]]}), or the backlinks and
+    outgoing links of one note with ?note=<path>.
+    """
+    if not link_graph.ready:
+        return jsonify({'error': 'Link graph is still being built'}), 503
+    link_graph.refresh_if_stale()
+    note_path = request.args.get('note', '').strip('/')
+    if note_path:
+        return jsonify({
+            'note': note_path,
+            'backlinks': link_graph.backlinks(note_path),
+            'outgoing': link_graph.outgoing(note_path),
+        })
+    return jsonify(link_graph.graph())
+
 @md_viewer_bp.route('/search')
 def search():
+    """
+    Search notes. Without paging arguments returns a JSON list of all results.
+    limit=N returns {'results': [...], 'next_cursor': ...} pages (pass the
+    cursor back to continue). stream=1 sends NDJSON, one result per line as it
+    is found, followed by a {"next_cursor": ...} line if limit cut it short;
+    the search stops when the client disconnects.
+    """
     query = request.args.get('q', '').lower()
-    if not query:
-        return jsonify([])
+    limit = request.args.get('limit', type=int)
+    cursor = max(request.args.get('cursor', 0, type=int), 0)
+    stream = request.args.get('stream') == '1'
+    if limit is not None:
+        limit = max(limit, 1)
 
-    results = []
+    if not query:
+        if stream:
+            return Response('', mimetype='application/x-ndjson')
+        return jsonify([] if limit is None else {'results': [], 'next_cursor': None})
+
+    # One extra result tells whether there is a next page
+    stop = cursor + limit + 1 if limit is not None else None
+    hits = islice(iter_search_results(query), cursor, stop)
+
+    if stream:
+        def generate():
+            # Results are produced lazily, so a closed connection ends the search
+            for count, hit in enumerate(hits):
+                if limit is not None and count == limit:
+                    yield json.dumps({'next_cursor': str(cursor + limit)}) + '\n'
+                    break
+                yield json.dumps(hit) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    if limit is None:
+        return jsonify(list(hits))
+    page = list(hits)
+    return jsonify({
+        'results': page[:limit],
+        'next_cursor': str(cursor + limit) if len(page) > limit else None
+    })
+
+def iter_search_results(query):
+    """Yield search results, from the index if it is ready, else by scanning the vault."""
+    index = get_search_index()
+    if index is None:
+        # Index is still being built - scan the vault like before
+        yield from scan_search(query)
+        return
+
+    index.refresh_if_stale()
+    for rel_path, _ in index.search(query):
+        yield {
+            'title': Path(rel_path).stem,  # Always use file name without .md
+            'url': url_for('md_viewer.note', note_path=rel_path),
+            'snippet': snippet_for(Path(NOTES_FOLDER) / rel_path, query)
+        }
+
+def scan_search(query):
+    """Search by reading every note, used until the search index is ready."""
     for root, _, files in os.walk(NOTES_FOLDER):
         for file in files:
             if not file.endswith('.md'):
@@ -151,23 +305,21 @@ def search():
                         end = min(len(content), pos + len(query) + 50)
                         snippet = content[start:end].strip()
 
-                        results.append({
+                        yield {
                             'title': title,
                             'url': url_for('md_viewer.note', note_path=str(file_path.relative_to(NOTES_FOLDER))),
                             'snippet': snippet
-                        })
+                        }
             except Exception as e:
                 print(f"Error reading {file_path}: {str(e)}")
 
-    return jsonify(results)
-
 @md_viewer_bp.route('/folder/<path:folder_path>')
 def folder(folder_path):
     folder_full_path = Path(NOTES_FOLDER) / folder_path
     if not folder_full_path.is_dir():
         return "Folder not found", 404
 
-    notes_tree = build_tree_structure(NOTES_FOLDER)
+    notes_tree = None if wants_fragment() else get_notes_tree()
     
     # Get allowed extensions from settings
     allowed_image_extensions = get_setting('MD_NOTES_APP', 'ALLOWED_IMAGE_EXTENSIONS', '').split(',')
@@ -184,51 +336,38 @@ def folder(folder_path):
         # Check if we should hide images
         images_hidden = get_setting('MD_NOTES_APP', 'IMAGES_FS_HIDE', fallback='False').lower() == 'true'
 
-        # Custom sort key function to order: folders first, then files (with images last)
-        def sort_key(x):
-            is_dir = x.is_dir()
-            is_image = not is_dir and get_file_type(x.suffix) == 'images'
-            return (not is_dir, is_image, x.name.lower())
-            
-        for item in sorted(current_folder.iterdir(), key=sort_key):
-            if item.name.startswith('.'):  # Skip hidden files
-                continue
+        # Order: folders first, then files (with images last)
+        items = scan_directory(current_folder, NOTES_FOLDER)
+        items.sort(key=lambda x: (not x.is_dir, x.file_type == 'images', x.name.lower()))
             
-            is_dir = item.is_dir()
-            rel_path = str(item.relative_to(NOTES_FOLDER))
-            
-            if is_dir:
+        for item in items:
+            if item.is_dir:
                 folder_contents.append({
                     'name': item.name,
                     'type': 'dir',
-                    'path': rel_path,
+                    'path': item.path,
+                    'display_name': item.name
+                })
+            elif item.file_type == 'md':
+                # Always show markdown files
+                folder_contents.append({
+                    'name': item.name,
+                    'type': 'md',
+                    'path': item.path,
+                    'display_name': item.stem
+                })
+            elif item.file_type and (not images_hidden or item.file_type != 'images'):
+                # Show other supported files if not hidden
+                folder_contents.append({
+                    'name': item.name,
+                    'type': item.file_type,
+                    'path': item.path,
                     'display_name': item.name
                 })
-            else:
-                # Get file type
-                file_type = get_file_type(item.suffix)
-                
-                # Handle different file types
-                if item.suffix == '.md':
-                    # Always show markdown files
-                    folder_contents.append({
-                        'name': item.name,
-                        'type': 'md',
-                        'path': rel_path,
-                        'display_name': item.stem
-                    })
-                elif file_type and (not images_hidden or file_type != 'images'):
-                    # Show other supported files if not hidden
-                    folder_contents.append({
-                        'name': item.name,
-                        'type': file_type,
-                        'path': rel_path,
-                        'display_name': item.name
-                    })
     except Exception as e:
         return f"Error reading folder: {str(e)}", 500
 
-    return render_template('folder.html',
+    return render_page('folder.html',
                          folder_path=folder_path,
                          folder_contents=folder_contents,
                          notes_tree=notes_tree,
@@ -236,7 +375,10 @@ def folder(folder_path):
                          current_note=None,
                          breadcrumbs=generate_breadcrumbs(folder_path),
                          allowed_image_extensions=allowed_image_extensions,
-                         allowed_file_extensions=allowed_file_extensions)
+                         allowed_file_extensions=allowed_file_extensions,
+                         upload_chunk_size=chunked_upload.upload_chunk_size(current_app.config['MAX_CONTENT_LENGTH']),
+                         max_request_size=current_app.config['MAX_CONTENT_LENGTH'],
+                         max_upload_size=chunked_upload.max_upload_size())
 
 
 @md_viewer_bp.route('/serve_stored_image/<path:filename>')
@@ -256,15 +398,41 @@ def serve_attatched_image(image_path):
     mode = get_setting('MD_NOTES_APP', 'IMAGE_STORAGE_MODE')
     notes_dir = NOTES_FOLDER
     
-    if mode == '1':  # Direct in NOTES_DIR
-        return send_from_directory(notes_dir, image_path)
-    elif mode == '2':  # Specific storage folder
+    if mode == '2':  # Specific storage folder
         storage_path = get_setting('MD_NOTES_APP', 'IMAGE_STORAGE_PATH')
-        return send_from_directory(storage_path, os.path.basename(image_path))
-    elif mode in ['3', '4']:  # In or below note directory
-        # For both modes, image path will include note directory path if needed
-        return send_from_directory(notes_dir, image_path)
-
+        if os.path.isfile(os.path.join(storage_path, os.path.basename(image_path))):
+            return send_from_directory(storage_path, os.path.basename(image_path))
+
+    # Modes 1, 3 and 4 (and mode 2 images kept in the vault): the path is
+    # relative to NOTES_DIR. Like Obsidian, an image that is not at that path
+    # is found by its name anywhere in the vault.
+    if not os.path.isfile(os.path.join(notes_dir, image_path)):
+        found = attachments.resolve(image_path) or attachments.resolve(os.path.basename(image_path))
+        if found is not None:
+            image_path = found
+    return send_from_directory(notes_dir, image_path)
+
+
+@md_viewer_bp.route('/thumbnail/<size>/<path:file_path>')
+def thumbnail(size, file_path):
+    """Serve a cached thumbnail (sizes in THUMBNAIL_SIZES) of an image in the vault"""
+    if size not in THUMBNAIL_SIZES:
+        return "Unknown thumbnail size", 404
+    full_path = Path(NOTES_FOLDER) / file_path
+    if '..' in file_path or not full_path.is_file() or get_file_type(full_path.suffix) != 'images':
+        return "Image not found", 404
+
+    if can_thumbnail(file_path):
+        try:
+            thumb_path = get_thumbnail(str(full_path), file_path, size)
+        except Exception as e:
+            # e.g. a broken image - let the browser try the original
+            print(f"Error creating thumbnail of {file_path}: {str(e)}")
+            thumb_path = None
+        if thumb_path is not None:
+            return send_from_directory(os.path.dirname(thumb_path), os.path.basename(thumb_path))
+    # Small images, svg, or Pillow not installed
+    return send_from_directory(full_path.parent, full_path.name)
 
 @md_viewer_bp.route('/view/<path:file_path>')
 def view_file(file_path):
@@ -296,20 +464,30 @@ def view_file(file_path):
         # For text files
         if file_type == 'text':
             try:
+                st = full_path.stat()
+                last_modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+                # Only .txt files use the template view, it also shows the side panel
+                is_page = full_path.suffix.lower() == '.txt'
+                notes_tree = None if wants_fragment() or not is_page else get_notes_tree()
+                etag = page_etag(file_path, st.st_mtime_ns, st.st_size, notes_tree_signature(notes_tree))
+                # Raw text only depends on the file, so If-Modified-Since is enough for it
+                cached = not_modified(etag, None if is_page else last_modified)
+                if cached is not None:
+                    return cached
+
                 with open(full_path, 'r', encoding='utf-8') as f:
                     content = f.read()
 
-                # Only .txt files use the template view
-                if full_path.suffix.lower() == '.txt':
+                if is_page:
                     breadcrumbs = generate_breadcrumbs(file_path)
-                    notes_tree = build_tree_structure(NOTES_FOLDER)
                     active_path = get_path_components(file_path)
-                    return render_template('view_text.html',
+                    response = render_page('view_text.html',
                                         file_name=full_path.name,
                                         content=content,
                                         notes_tree=notes_tree,
                                         active_path=active_path,
                                         breadcrumbs=breadcrumbs)
+                    return set_validators(response, etag, last_modified)
 
                 # For JSON files, try to pretty print
                 if full_path.suffix.lower() == '.json':
@@ -342,9 +520,10 @@ def view_file(file_path):
                         pass
 
                 # All other text files are served as raw text
-                return Response(content, 
+                response = Response(content, 
                               mimetype='text/plain',
                               headers={'Content-Disposition': f'inline; filename="{full_path.name}"'})
+                return set_validators(response, etag, last_modified)
 
             except UnicodeDecodeError:
                 return "File cannot be read as text", 400
@@ -355,6 +534,49 @@ def view_file(file_path):
         current_app.logger.error(f"Error viewing file {file_path}: {str(e)}")
         return str(e), 500
 
+def allowed_upload_extensions():
+    """All extensions (with the dot) that may be uploaded."""
+    all_allowed_extensions = set()
+    for extensions in get_allowed_file_types().values():
+        all_allowed_extensions.update(extensions)
+    return all_allowed_extensions
+
+def check_upload_name(filename, allowed_extensions):
+    """Secure an upload's file name and check its extension. Raises UploadError."""
+    filename = secure_filename(filename or '')
+    if not filename:
+        raise UploadError('No selected file')
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext not in allowed_extensions:
+        raise UploadError(f'File type {file_ext} not allowed')
+    return filename
+
+def check_upload_folder(folder):
+    """Path of an upload's target folder, which must be within NOTES_FOLDER. Raises UploadError."""
+    upload_folder = Path(NOTES_FOLDER) / (folder or '').strip('/')
+    try:
+        # A prefix check would let a sibling like notes_evil/ through
+        upload_folder.resolve().relative_to(Path(NOTES_FOLDER).resolve())
+    except (ValueError, RuntimeError):
+        raise UploadError('Invalid folder path')
+    return upload_folder
+
+def check_upload_target(filename, folder):
+    """
+    Check an upload's file name and target folder. Returns (filename,
+    upload_folder), or raises UploadError.
+    """
+    return check_upload_name(filename, allowed_upload_extensions()), check_upload_folder(folder)
+
+def file_uploaded(final_path):
+    """Update the tree and the indexes for a file added to the vault."""
+    rel_path = os.path.relpath(final_path, NOTES_FOLDER)
+    invalidate_notes_tree(final_path)
+    update_search_index(rel_path)
+    note_links.add(rel_path)
+    attachments.add(rel_path)
+    update_link_graph(rel_path)
+
 @md_viewer_bp.route('/upload', methods=['POST'])
 def upload_file():
     try:
@@ -364,49 +586,138 @@ def upload_file():
         file = request.files['file']
         if file.filename == '':
             return jsonify({'error': 'No selected file'}), 400
-            
-        folder = request.form.get('folder', '')
-        
-        # Secure the filename and get extension
-        filename = secure_filename(file.filename)
+
+        try:
+            filename, upload_folder = check_upload_target(file.filename, request.form.get('folder', ''))
+        except UploadError as e:
+            return jsonify({'error': str(e)}), 400
         file_ext = os.path.splitext(filename)[1].lower()
-        
-        # Get allowed extensions
-        allowed_types = get_allowed_file_types()
-        all_allowed_extensions = set()
-        for extensions in allowed_types.values():
-            all_allowed_extensions.update(extensions)
-            
-        if file_ext not in all_allowed_extensions:
-            return jsonify({'error': f'File type {file_ext} not allowed'}), 400
-            
-        # Create target directory if it doesn't exist
-        upload_folder = Path(NOTES_FOLDER) / folder
-        upload_folder.mkdir(parents=True, exist_ok=True)
-        
-        # Save the file temporarily for type verification
-        temp_path = upload_folder / f"temp_{filename}"
-        file.save(temp_path)
-        
-        # Verify the file type
-        is_valid, actual_type = verify_file_type(temp_path, file_ext)
+
+        # Verify the file type from the start of the upload, before saving it
+        header = file.stream.read(MAGIC_HEADER_BYTES)
+        file.stream.seek(0)
+        is_valid, actual_type = verify_file_header(header, file_ext)
         
         if not is_valid:
-            os.remove(temp_path)  # Clean up temp file
             return jsonify({
                 'error': f'File content does not match its extension. '
                         f'Claimed: {file_ext}, Detected: {actual_type}'
             }), 400
-            
-        # Move to final location
+
+        # Create target directory if it doesn't exist
+        upload_folder.mkdir(parents=True, exist_ok=True)
+
+        # Save under a temporary name, then move to the final location
+        temp_path = upload_folder / f"temp_{filename}"
+        file.save(temp_path)
         final_path = upload_folder / filename
         temp_path.rename(final_path)
+        file_uploaded(final_path)
         
         return jsonify({'message': 'File uploaded successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@md_viewer_bp.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Upload many files (multipart field 'files') into one folder. Returns a
+    manifest with the result of every file; the request only fails as a whole
+    if the folder is invalid or there are no files.
+    """
+    try:
+        files = request.files.getlist('files')
+        if not files:
+            return jsonify({'error': 'No files'}), 400
+        try:
+            upload_folder = check_upload_folder(request.form.get('folder', ''))
+        except UploadError as e:
+            return jsonify({'error': str(e)}), 400
+
+        allowed_extensions = allowed_upload_extensions()
+        entries = []
+        for file in files:
+            try:
+                entries.append((file, check_upload_name(file.filename, allowed_extensions), None))
+            except UploadError as e:
+                entries.append((file, None, str(e)))
+
+        upload_folder.mkdir(parents=True, exist_ok=True)
+        results = save_batch(entries, upload_folder)
+        for file_result in results:
+            path = file_result.pop('path')
+            if path is not None:
+                file_uploaded(path)
+
+        uploaded = sum(1 for file_result in results if file_result['error'] is None)
+        return jsonify({'uploaded': uploaded, 'failed': len(results) - uploaded, 'files': results})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@md_viewer_bp.route('/upload/chunked', methods=['POST'])
+def start_chunked_upload():
+    """Start a chunked upload: {filename, folder, size} -> upload id and chunk size"""
+    data = request.get_json(silent=True) or request.form
+    try:
+        filename, upload_folder = check_upload_target(data.get('filename'), data.get('folder', ''))
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            raise UploadError('Missing or invalid file size')
+        meta = chunked_upload.start_upload(
+            filename, os.path.relpath(upload_folder, NOTES_FOLDER), size,
+            chunked_upload.upload_chunk_size(current_app.config['MAX_CONTENT_LENGTH']))
+        return jsonify(chunked_upload.upload_status(meta))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@md_viewer_bp.route('/upload/chunked/<upload_id>', methods=['GET', 'DELETE'])
+def chunked_upload_status(upload_id):
+    """Chunks received so far (to resume an upload), or cancel it"""
+    meta = chunked_upload.load_upload(upload_id)
+    if meta is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    if request.method == 'DELETE':
+        chunked_upload.abort_upload(meta)
+        return jsonify({'message': 'Upload cancelled'})
+    return jsonify(chunked_upload.upload_status(meta))
+
+@md_viewer_bp.route('/upload/chunked/<upload_id>/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """Store one chunk (raw request body, optional X-Chunk-SHA256 header)"""
+    meta = chunked_upload.load_upload(upload_id)
+    if meta is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        chunked_upload.save_chunk(meta, index, request.get_data(cache=False),
+                                  request.headers.get('X-Chunk-SHA256'))
+        return jsonify({'received': index})
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@md_viewer_bp.route('/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Assemble the chunks into the target folder, optionally checking the file's SHA-256"""
+    meta = chunked_upload.load_upload(upload_id)
+    if meta is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    data = request.get_json(silent=True) or request.form
+    try:
+        final_path = chunked_upload.complete_upload(
+            meta, os.path.join(NOTES_FOLDER, meta['folder']), data.get('sha256'))
+        file_uploaded(final_path)
+        return jsonify({'message': 'File uploaded successfully'})
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @md_viewer_bp.route('/download_file')
 def download_file():
     """Download a file from the notes directory"""
@@ -437,3 +748,25 @@ def download_file():
         current_app.logger.error(f"Error downloading file: {str(e)}")
         return str(e), 500
 
+@md_viewer_bp.route('/download_folder')
+def download_folder():
+    """Download a folder of the notes directory (the whole vault without path) as a ZIP"""
+    folder_path = request.args.get('path', '').strip('/')
+    full_path = Path(NOTES_FOLDER) / folder_path
+
+    # Security check - ensure folder is within NOTES_FOLDER
+    try:
+        rel_path = full_path.resolve().relative_to(Path(NOTES_FOLDER).resolve())
+    except (ValueError, RuntimeError):
+        return "Invalid folder path", 403
+
+    # Hidden and NOTES_DIR_SKIP folders are left out of the archive, so they
+    # can't be downloaded directly either
+    if not full_path.is_dir() or is_skipped_vault_path(rel_path):
+        return "Folder not found", 404
+
+    name = (full_path.resolve().name or 'notes') + '.zip'
+    response = Response(stream_with_context(iter_folder_zip(str(full_path), NOTES_FOLDER)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+    return response
+
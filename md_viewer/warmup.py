@@ -0,0 +1,150 @@
+"""
+Pre-render the vault into the rendered note cache at startup.
+
+After a restart every note pays the full Markdown parse + render the first time
+it is opened. start_warmup() renders all notes up front with render_markdown_with_links()
+in a pool of worker processes and stores the HTML in rendered_notes, keyed by
+the same identity viewer.note uses, so the first visitor gets a cache hit.
+
+The workers are forked from the app (they share its settings and URL map) and
+each renders inside a test request context for SERVER_NAME and
+APPLICATION_ROOT, so url_for() builds the links a real request would. All
+workers are forked when the pool is started, which start_warmup() does in the
+calling thread - call it before other threads (search index build) are started.
+
+The cache is per process, and each process of a multi-worker server (gunicorn
+-w N) imports the app. Only the first one to take WARMUP_LOCK_FILE pre-renders,
+so the vault is rendered once instead of N times; the other workers fill
+their cache as notes are opened.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app_settings_loader import ROOT_DIR
+from md_viewer.render_cache import rendered_notes, note_identity
+from md_viewer.support_functions import NOTES_FOLDER, render_markdown_with_links, iter_vault_notes
+
+PROGRESS_STEPS = 10  # progress is reported every 1/PROGRESS_STEPS of the vault
+
+# Progress of the last warm-up, shown by /settings/render_cache
+warmup_status = {'running': False, 'total': 0, 'done': 0, 'failed': 0, 'seconds': None}
+
+# The Flask app the workers render with, inherited by fork
+_worker_app = None
+
+# Held by the process that pre-renders, for as long as it runs
+WARMUP_LOCK_FILE = os.path.join(ROOT_DIR, 'warmup.lock')
+_warmup_lock = None
+
+
+def _take_warmup_lock():
+    """True if this process may pre-render: no other process holds WARMUP_LOCK_FILE."""
+    global _warmup_lock
+    if _warmup_lock is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # No fork either (Windows), so no worker processes sharing the app
+        return True
+    lock_file = open(WARMUP_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Released when the process exits
+    _warmup_lock = lock_file
+    return True
+
+
+def _base_url(app):
+    """URL of the app's root from SERVER_NAME and APPLICATION_ROOT, like a real request."""
+    return '{}://{}{}'.format(app.config.get('PREFERRED_URL_SCHEME') or 'http',
+                              app.config.get('SERVER_NAME') or 'localhost',
+                              (app.config.get('APPLICATION_ROOT') or '/').rstrip('/'))
+
+
+def _render_note(note_path):
+    """Worker: render one note, return (note_path, identity, html, links, error)."""
+    full_path = os.path.join(NOTES_FOLDER, note_path)
+    try:
+        st = os.stat(full_path)
+        with open(full_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        # Links are built for the configured mount point; requests under
+        # another prefix get a different identity and render on their own
+        with _worker_app.test_request_context('/', base_url=_base_url(_worker_app)):
+            html, links = render_markdown_with_links(content, note_path)
+            identity = note_identity(st)
+        return note_path, identity, html, links, None
+    except Exception as e:
+        return note_path, None, None, None, str(e)
+
+
+def _collect(executor, futures, started):
+    """Store finished renders in rendered_notes and report progress."""
+    total = len(futures)
+    step = max(1, total // PROGRESS_STEPS)
+    try:
+        for future in as_completed(futures):
+            note_path, identity, html, links, error = future.result()
+            if error is None:
+                rendered_notes.put(note_path, identity, html, links=links)
+            else:
+                warmup_status['failed'] += 1
+                print(f"Error pre-rendering {note_path}: {error}")
+            warmup_status['done'] += 1
+            done = warmup_status['done']
+            if done % step == 0 or done == total:
+                print(f"Pre-rendered {done}/{total} notes ({time.monotonic() - started:.1f}s)")
+    except Exception as e:
+        print(f"Error pre-rendering notes: {str(e)}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        warmup_status['running'] = False
+        warmup_status['seconds'] = round(time.monotonic() - started, 2)
+
+
+def start_warmup(app, workers=0, background=True):
+    """
+    Render every note of the vault into rendered_notes using up to `workers`
+    processes (0 = one per CPU). The pool is started in the calling thread;
+    the results are collected in a background thread unless background=False.
+    """
+    global _worker_app
+    if rendered_notes.max_bytes <= 0:
+        print("Rendered note cache is disabled (RENDER_CACHE_MB = 0), skipping pre-render")
+        return
+    if warmup_status['running']:
+        return
+    if not _take_warmup_lock():
+        print("Another worker process is pre-rendering the notes, skipping pre-render")
+        return
+
+    started = time.monotonic()
+    note_paths = [path for path, _ in iter_vault_notes(NOTES_FOLDER)]
+    if not note_paths:
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(note_paths))
+    warmup_status.update(running=True, total=len(note_paths), done=0, failed=0, seconds=None)
+    _worker_app = app
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        futures = [executor.submit(_render_note, path) for path in note_paths]
+    except Exception as e:
+        # e.g. fork is not available on this platform - notes are rendered on first view
+        warmup_status['running'] = False
+        print(f"Error starting pre-render: {str(e)}")
+        return
+    print(f"Pre-rendering {len(note_paths)} notes with {workers} processes")
+
+    if background:
+        threading.Thread(target=_collect, args=(executor, futures, started),
+                         name='note-warmup', daemon=True).start()
+    else:
+        _collect(executor, futures, started)
@@ -0,0 +1,98 @@
+"""
+ZIP archives of vault folders, streamed as they are written.
+
+iter_folder_zip() is a generator of archive chunks: files are read and
+compressed CHUNK_SIZE bytes at a time and every chunk is yielded as soon as
+zipfile has written it, so there is no temp file and memory stays at about
+one chunk plus the central directory. Entries use data descriptors (the
+output is not seekable) and zip64 when a file is close to 4 GB.
+
+Formats that are already compressed (images, archives) are stored as is;
+everything else is deflated. Hidden files and NOTES_DIR_SKIP folders are left
+out, like everywhere else in the app, and so are symlinks that point outside
+the vault or into such a folder. If the client goes away the generator is
+closed at the next yield and the open file with it.
+"""
+import os
+from pathlib import Path
+import zipfile
+
+from md_viewer.support_functions import iter_vault_files, is_skipped_vault_path
+
+CHUNK_SIZE = 64 * 1024
+# Deflating these again only costs CPU
+STORED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.heic',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar',
+    '.mp3', '.mp4', '.m4a', '.mkv', '.webm', '.ogg',
+}
+
+
+class _ChunkBuffer:
+    """Write-only, unseekable file object that collects what zipfile writes."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _vault_file(full_path, vault_root):
+    """Resolved path of full_path if it is a file the vault may serve, else None."""
+    resolved = Path(full_path).resolve()
+    try:
+        rel_path = resolved.relative_to(vault_root)
+    except ValueError:
+        return None
+    if is_skipped_vault_path(rel_path):
+        return None
+    return str(resolved)
+
+
+def iter_folder_zip(folder, vault_root):
+    """Yield a ZIP archive of every file under folder (within vault_root), in chunks."""
+    vault_root = Path(vault_root).resolve()
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', allowZip64=True, strict_timestamps=False) as zf:
+        for rel_path, _ in iter_vault_files(folder, lambda name: True):
+            # Symlinks are followed by from_file() and open(), so only keep
+            # the ones that stay in the vault
+            full_path = _vault_file(os.path.join(folder, rel_path), vault_root)
+            if full_path is None:
+                continue
+            try:
+                # Dates ZIP can't store (before 1980) are clamped instead of failing
+                zinfo = zipfile.ZipInfo.from_file(full_path, rel_path, strict_timestamps=False)
+                src = open(full_path, 'rb')
+            except OSError as e:
+                # Deleted or unreadable since the folder was listed
+                print(f"Error adding {rel_path} to zip: {str(e)}")
+                continue
+            if os.path.splitext(rel_path)[1].lower() in STORED_EXTENSIONS:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+            # zinfo has the file size, so zipfile switches to zip64 when needed
+            with src, zf.open(zinfo, 'w') as dest:
+                while True:
+                    data = src.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    dest.write(data)
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+            # Local header of empty files and the data descriptor
+            yield buffer.drain()
+    # Central directory
+    yield buffer.drain()